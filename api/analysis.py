@@ -0,0 +1,244 @@
+import json
+import logging
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING
+
+from prometheus_client import Histogram
+from sqlalchemy import desc
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from .llm import get_gateway
+from .logic.cache import CacheStats
+from .logic.database import GeminiFile, VideoAnalysis, OperationStatus, get_session
+from .logic.metrics import DEFAULT_BUCKETS
+from .logic.models import MealPlan
+from .logic.uploads import remove_spooled_file
+
+if TYPE_CHECKING:
+    from google.genai import types
+
+logger = logging.getLogger("meal_planner_api.analysis")
+
+VIDEO_ANALYSIS_OPERATION = "video_analysis"
+
+# Model and prompt used for video analysis; both are part of the analysis cache key
+VIDEO_ANALYSIS_MODEL = "gemini-2.0-flash"
+VIDEO_ANALYSIS_PROMPT = """
+        Analyze this video showing food items and create a simple meal plan.
+        
+        Based on the food items visible in the video, generate:
+        1. ONE meal per day for each day of the week (Monday to Sunday)
+        2. For each meal, provide a simple recipe with ingredients list and basic instructions
+        3. A shopping list with any additional ingredients needed that weren't shown in the video
+        
+        Keep everything simple and straightforward.
+        """
+
+# Gemini rejects inline requests larger than 20 MB. The limit covers the whole request:
+# the base64-encoded video (a third larger than the file) plus the prompt, for which
+# GEMINI_INLINE_HEADROOM_BYTES are reserved. Larger videos go through the files API.
+GEMINI_INLINE_MAX_BYTES = int(os.getenv("GEMINI_INLINE_MAX_BYTES", str(20 * 1024 * 1024)))
+GEMINI_INLINE_HEADROOM_BYTES = int(os.getenv("GEMINI_INLINE_HEADROOM_BYTES", str(256 * 1024)))
+# Do not reuse an uploaded file that expires sooner than this
+GEMINI_FILE_EXPIRY_MARGIN = timedelta(minutes=30)
+
+# Hit/miss counters for the content-addressed analysis cache
+analysis_cache_stats = CacheStats("video_analysis")
+
+# Where analyze-video requests and their jobs spend time: spool, cache_lookup and enqueue
+# in the request; read_video, gemini_upload, gemini_generate and db_commit in the job
+ANALYSIS_STAGE_SECONDS = Histogram(
+    "analysis_stage_seconds", "Time per video analysis stage", ("stage",), buckets=DEFAULT_BUCKETS,
+)
+
+# Writes invalidate the latest-plan cache of their own process; the TTL bounds how long
+# other API processes keep serving a plan that was replaced elsewhere
+LATEST_PLAN_TTL_SECONDS = float(os.getenv("LATEST_PLAN_TTL_SECONDS", "5"))
+
+
+def is_cached_analysis(analysis: VideoAnalysis | None) -> bool:
+    """Check whether a stored analysis was produced by the current prompt and model"""
+    return (
+        analysis is not None
+        and analysis.prompt == VIDEO_ANALYSIS_PROMPT
+        and analysis.model == VIDEO_ANALYSIS_MODEL
+    )
+
+
+def plan_document(analysis: VideoAnalysis) -> dict:
+    """Meal plan document of an analysis row; rows from before the JSONB migration may hold a JSON string"""
+    document = analysis.analysis_text
+    return json.loads(document) if isinstance(document, str) else document
+
+
+def load_meal_plan(analysis: VideoAnalysis) -> MealPlan:
+    """Parse the meal plan stored in an analysis row"""
+    return MealPlan.model_validate(plan_document(analysis))
+
+
+def analysis_etag(analysis: VideoAnalysis) -> str:
+    """Strong ETag of an analysis row; changes with every update because the version does"""
+    return f'"{analysis.id[:16]}-{analysis.version}"'
+
+
+class LatestPlanCache:
+    """In-process cache of the serialized latest meal plan and its ETag."""
+
+    def __init__(self, ttl: float = LATEST_PLAN_TTL_SECONDS):
+        self.ttl = ttl
+        self.stats = CacheStats("latest_meal_plan")
+        self._entry: tuple[bytes, str] | None = None
+        self._expires_at = 0.0
+        # Bumped on every invalidation so a load that raced with a write is not cached
+        self._generation = 0
+        self._lock = Lock()
+
+    def get(self) -> tuple[bytes, str] | None:
+        """Return (JSON body, ETag) of the latest plan, or None when there is no analysis."""
+        with self._lock:
+            if self._entry is not None and time.monotonic() < self._expires_at:
+                self.stats.hit()
+                return self._entry
+            generation = self._generation
+        self.stats.miss()
+
+        entry = self._load()
+        with self._lock:
+            if entry is not None and generation == self._generation:
+                self._entry = entry
+                self._expires_at = time.monotonic() + self.ttl
+        return entry
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entry = None
+            self._generation += 1
+
+    @staticmethod
+    def _load() -> tuple[bytes, str] | None:
+        session = get_session()
+        try:
+            analysis = session.query(VideoAnalysis).order_by(desc(VideoAnalysis.created_at)).first()
+            if analysis is None:
+                return None
+            return load_meal_plan(analysis).model_dump_json().encode(), analysis_etag(analysis)
+        finally:
+            session.close()
+
+
+latest_plan_cache = LatestPlanCache()
+
+
+def get_uploaded_video(db: Session, file_hash: str, video_path: str, content_type: str) -> GeminiFile:
+    """Return a live files-API handle for this video, uploading it only if none is cached"""
+    cached = db.query(GeminiFile).filter(GeminiFile.file_hash == file_hash).first()
+    if cached and cached.expires_at > datetime.utcnow() + GEMINI_FILE_EXPIRY_MARGIN:
+        logger.info(f"Reusing uploaded file {cached.name} for sha256={file_hash}")
+        return cached
+
+    with ANALYSIS_STAGE_SECONDS.labels(stage="gemini_upload").time():
+        uploaded, expires_at = get_gateway().upload_file(video_path, content_type, operation="video_upload")
+    logger.info(f"Uploaded sha256={file_hash} as {uploaded.name}")
+
+    cached = cached or GeminiFile(file_hash=file_hash)
+    cached.name = uploaded.name
+    cached.uri = uploaded.uri
+    cached.mime_type = uploaded.mime_type or content_type
+    cached.expires_at = expires_at
+    cached.created_at = datetime.utcnow()
+    db.add(cached)
+    db.commit()
+    return cached
+
+
+def fits_inline(size: int) -> bool:
+    """Whether a video of size bytes, base64-encoded, still fits an inline request"""
+    return math.ceil(size / 3) * 4 + GEMINI_INLINE_HEADROOM_BYTES <= GEMINI_INLINE_MAX_BYTES
+
+
+def build_video_part(db: Session, file_hash: str, video_path: str, content_type: str) -> "types.Part":
+    """Reference large videos by files-API URI and send small ones inline"""
+    from google.genai import types
+
+    if not fits_inline(os.path.getsize(video_path)):
+        uploaded = get_uploaded_video(db, file_hash, video_path, content_type)
+        return types.Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type)
+
+    # Inline requests need the bytes once; read them straight from the spool
+    with ANALYSIS_STAGE_SECONDS.labels(stage="read_video").time():
+        data = Path(video_path).read_bytes()
+    return types.Part(
+        inline_data=types.Blob(
+            mime_type=content_type,
+            data=data
+        )
+    )
+
+
+def generate_meal_plan(video_part: "types.Part") -> dict:
+    """Send a video to Gemini and return the generated meal plan as a dict"""
+    from google.genai import types
+
+    # Create content with video data
+    contents = [
+        types.Content(
+            role="user",
+            parts=[
+                types.Part.from_text(text=VIDEO_ANALYSIS_PROMPT),
+                video_part,
+            ],
+        ),
+    ]
+
+    # Generate content with temperature=0 and JSON response type
+    with ANALYSIS_STAGE_SECONDS.labels(stage="gemini_generate").time():
+        response = get_gateway().generate_content(
+            operation="video_analysis",
+            model=VIDEO_ANALYSIS_MODEL,
+            contents=contents,
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                temperature=0,
+                response_schema=MealPlan
+            )
+        )
+
+    return response.parsed.model_dump()
+
+
+def run_analysis_job(db: Session, job: OperationStatus, video_path: str) -> None:
+    """Worker entry point: analyze a spooled video and store the plan under its file hash"""
+    try:
+        video_part = build_video_part(db, job.file_hash, video_path, job.content_type)
+        meal_plan_data = generate_meal_plan(video_part)
+
+        with ANALYSIS_STAGE_SECONDS.labels(stage="db_commit").time():
+            # Upsert under the file hash, so a concurrent writer of the same video cannot hit the primary key;
+            # refreshing a stale or forced entry bumps its version, which invalidates ETags and pending patches
+            columns = dict(
+                filename=job.filename,
+                content_type=job.content_type,
+                prompt=VIDEO_ANALYSIS_PROMPT,
+                model=VIDEO_ANALYSIS_MODEL,
+                analysis_text=meal_plan_data,
+                created_at=datetime.utcnow(),
+            )
+            db.execute(
+                insert(VideoAnalysis)
+                .values(id=job.file_hash, version=1, **columns)
+                .on_conflict_do_update(
+                    index_elements=[VideoAnalysis.id],
+                    set_={**columns, "version": VideoAnalysis.version + 1},
+                )
+            )
+            db.commit()
+        latest_plan_cache.invalidate()
+        logger.info(f"Stored analysis for sha256={job.file_hash} (job {job.job_id})")
+    finally:
+        remove_spooled_file(video_path)
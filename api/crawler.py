@@ -1,315 +1,108 @@
-# Apply nest_asyncio to allow nested event loops
-import nest_asyncio
-import traceback
-
-nest_asyncio.apply()
-
-# Import standard libraries
-import os
-from threading import Thread
-from dotenv import load_dotenv
-
 # Import third-party modules
-import scrapy
-from fastapi import APIRouter, BackgroundTasks
-from google import genai
-from pydantic import BaseModel
-from scrapy import signals
-from scrapy.crawler import CrawlerRunner
-from scrapy.utils.project import get_project_settings
-from twisted.internet import reactor
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
 # Import application-specific modules
 from .logic.database import FoodItemDB, get_session
-
-# Load environment variables
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", None)
-
-# Configure Scrapy settings
-settings = get_project_settings()
-settings.update({
-    'LOG_LEVEL': 'DEBUG',
-    'ROBOTSTXT_OBEY': False,
-    'COOKIES_ENABLED': True,
-    'CONCURRENT_REQUESTS': 1,
-    'DOWNLOAD_DELAY': 2,
-    'USER_AGENT': (
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-        '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-    ),
-    'DEFAULT_REQUEST_HEADERS': {
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'Accept-Language': 'de,en-US;q=0.9,en;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1'
-    }
-})
-runner = CrawlerRunner(settings)
-
-# Global flag indicating if a crawl is in progress
-is_crawler_running = False
-
-# Start the Twisted reactor in a background thread if not already running
-if not reactor.running:
-    def run_reactor() -> None:
-        reactor.run(installSignalHandlers=False)
-
-
-    Thread(target=run_reactor, daemon=True).start()
-
-
-# Define the schema for food items
-class FoodItem(BaseModel):
-    source_url: str
-    food_name: str
-    food_item_description: str
-    price: str
-    quantity: str
-
-
-# List of target websites
-WEBSITES = [
-    "https://www.aldi-nord.de/",
-    "https://www.aldi-sued.de/",
-    "https://www.lidl.de/",
-    "https://www.lidl.de/c/billiger-montag/a10006065?channel=store&tabCode=Current_Sales_Week",
-    "https://netto.de/",
-    "https://https://www.edeka.de/eh/angebote.jsp",
-    "https://www.rewe.de/",
-    "https://www.penny.de/",
-    "https://www.real.de/",
-    "https://www.kaufland.de/",
-    "https://www.metro.de/",
-    "https://www.otto.de/",
-]
-
-
-def extract_food_items(page_text: str) -> list[FoodItem]:
-    """Use the Gemini API to extract food item details from page_text.
-    Returns a list of FoodItem objects.
-    """
-    if not GEMINI_API_KEY:
-        return []
-    try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        prompt = f"""
-        Given the following TEXT, identify food items along with their details.
-
-        For each food item, extract the following fields:
-        - **food_name**: The exact name of the product as listed.
-        - **food_item_description**: A detailed description that clearly explains what the product is. Translate the description into English except for brand names and product names.
-        - **price**: The price of the product in EUR.
-        - **quantity**: The quantity or size information if available. Convert any German measurement units or quantity terms in this field to English as specified below.
-
-        Please apply these conversions in the quantity field (and in the description if applicable):
-        - "g" → "grams"
-        - "kg" → "kilograms"
-        - "ml" → "milliliters"
-        - "l" → "liters"
-        - "Stück" → "piece" (or "pieces" when plural)
-        - "Packung" → "pack"
-        - "Flasche" → "bottle"
-        - "Dose" → "can"
-
-        Ensure that:
-        • All units and quantity terms are fully converted to their English equivalents.
-        • The food item description is translated into English without using vague or generic terms (e.g., "Various kinds" or "Verschiedene Sorten"). Instead, be specific—for example, clarify if a product like "GAZI Grill- und Pfannenkäse" is a processed cheese or a type of grillable cheese.
-        • Leave brand names out of the foot item description; instead, provide a descriptive explanation of the product.
-        • The output is a valid JSON array of objects following the schema below.
-
-        Example:
-        [
-            {{
-                "food_name": "Rittersport",
-                "food_item_description": "A milk chocolate bar with a smooth texture and rich flavor",
-                "price": "2.99 EUR",
-                "quantity": "100 grams"
-            }},
-            {{
-                "food_name": "Organic Bread",
-                "food_item_description": "A freshly baked whole wheat bread loaf with a crunchy crust and soft interior",
-                "price": "3.50 EUR",
-                "quantity": "500 grams"
-            }}
-        ]
-
-        TEXT:
-        {page_text}
-        """
-
-        # Define schema as a dictionary instead of using list[FoodItem]
-        response_schema = {
-            "type": "array",
-            "items": {
-                "type": "object",
-                "properties": {
-                    "source_url": {"type": "string"},
-                    "food_name": {"type": "string"},
-                    "food_item_description": {"type": "string"},
-                    "price": {"type": "string"},
-                    "quantity": {"type": "string"}
-                },
-                "required": ["food_name", "food_item_description", "price", "quantity"]
-            }
-        }
-
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-            config={
-                "response_mime_type": "application/json",
-                "response_schema": response_schema,
-                "temperature": 0,
-            },
-        )
-        
-        # Parse the response into FoodItem objects
-        items_data = response.text
-        if not items_data:
-            return []
-            
-        try:
-            import json
-            items_json = json.loads(items_data)
-            food_items = []
-            
-            for item_data in items_json:
-                # Add source_url if not provided
-                if "source_url" not in item_data:
-                    item_data["source_url"] = ""
-                
-                food_items.append(FoodItem(**item_data))
-            
-            return food_items
-        except Exception as e:
-            traceback.print_exc()
-            print(f"Error parsing response: {str(e)}")
-            return []
-            
-    except Exception as e:
-        # Log error with full traceback if Gemini API call fails
-        traceback.print_exc()
-        print(f"Gemini API error: {str(e)}")
-        return []
-
-
-class FoodCrawler(scrapy.Spider):
-    name = "food_crawler"
-
-    def start_requests(self):
-        """
-        Yield requests for each website in the WEBSITES list.
-        """
-        for url in WEBSITES:
-            yield scrapy.Request(
-                url=url,
-                callback=self.parse_page,
-                dont_filter=True,
-                headers={
-                    'User-Agent': (
-                        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
-                        '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                    ),
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                    'Accept-Language': 'de,en-US;q=0.9,en;q=0.8',
-                }
-            )
-
-    def parse_page(self, response):
-        """Parse the response and extract food items using Gemini API.
-        Save the results in the database.
-        """
-        page_text = response.text
-        items = extract_food_items(page_text)
-        session = get_session()
-        try:
-            for item in items:
-                db_item = FoodItemDB(
-                    source_url=response.url,
-                    food_name=item.food_name,
-                    food_item_description=item.food_item_description,
-                    price=item.price,
-                    quantity=item.quantity,
-                )
-                session.add(db_item)
-            session.commit()
-        finally:
-            session.close()
-
-
-def crawl() -> dict:
-    """Schedule the FoodCrawler to run.
-    Returns a message if a crawl is already in progress.
-    """
-    global is_crawler_running
-    if is_crawler_running:
-        return {"message": "Crawler is already running"}
-    is_crawler_running = True
-    session = get_session()
-
-    def item_scraped_callback(signal, sender, item, response, spider):
-        try:
-            db_item = FoodItemDB(
-                source_url=item['source_url'],
-                food_name=item['food_name'],
-                food_item_description=item['food_item_description'],
-                price=item['price'],
-                quantity=item['quantity'],
-            )
-            session.add(db_item)
-            session.commit()
-        except Exception as e:
-            traceback.print_exc()
-            print(f"Error saving item: {str(e)}")
-
-    def cleanup(result):
-        global is_crawler_running
-        is_crawler_running = False
-        session.close()
-        return result
-
-    try:
-        # Clear previous items
-        session.query(FoodItemDB).delete()
-        session.commit()
-        crawler_instance = runner.create_crawler(FoodCrawler)
-        crawler_instance.signals.connect(item_scraped_callback, signal=signals.item_scraped)
-        deferred = runner.crawl(crawler_instance)
-        deferred.addBoth(cleanup)
-        return {"message": "Scrape started"}
-    except Exception as e:
-        traceback.print_exc()
-        print(f"Crawl error: {str(e)}")
-        cleanup(None)
-        raise e
-
+from .logic.normalize import normalize_quantity
+from .logic.results import (
+    RESULTS_MAX_PAGE_SIZE,
+    RESULTS_PAGE_SIZE,
+    fetch_page,
+    parse_fields,
+    results_query,
+    stream_ndjson,
+)
+from .logic.snapshots import (
+    RUNNING,
+    active_crawl_run,
+    current_crawl_id_query,
+    last_completed_crawl_run,
+    reap_stale_crawl_runs,
+    request_crawl_run,
+)
+
+# Crawls run in the crawler worker (python -m api.crawler_worker); the API only
+# requests them and reads their state from the database
 
 router = APIRouter()
 
 
 @router.get("/scrape")
-async def scrape_data(background_tasks: BackgroundTasks) -> dict:
-    """Endpoint to trigger the crawl in the background."""
-    if is_crawler_running:
+def scrape_data() -> dict:
+    """Endpoint to request a crawl from the crawler worker."""
+    crawl_id = request_crawl_run()
+    if crawl_id is None and reap_stale_crawl_runs():
+        # The active run was abandoned; without a worker polling, nothing else would expire it
+        crawl_id = request_crawl_run()
+    if crawl_id is None:
         return {"message": "Crawler is already running"}
-    background_tasks.add_task(crawl)
-    return {"message": "Scrape started in background"}
+    return {"message": "Scrape requested", "crawl_id": crawl_id}
 
 
 @router.get("/status")
 def get_crawler_status() -> dict:
-    """Endpoint to check if a crawl is currently running."""
-    return {"is_running": is_crawler_running}
+    """Endpoint to check if a crawl is currently requested or running."""
+    active = active_crawl_run()
+    last_completed = last_completed_crawl_run()
+    session = get_session()
+    try:
+        current_crawl_id = session.scalar(current_crawl_id_query())
+    finally:
+        session.close()
+    return {
+        "is_running": active is not None and active.status == RUNNING,
+        "active_crawl": active.as_dict() if active else None,
+        "current_crawl_id": current_crawl_id,
+        "last_crawl_stats": last_completed.stats if last_completed else {},
+    }
 
 
 @router.get("/results")
-def get_results() -> dict:
-    """Endpoint to retrieve scraped results from the database."""
+def get_results(
+        after_id: int | None = Query(None, description="Keyset cursor: only items with a larger id"),
+        limit: int = Query(RESULTS_PAGE_SIZE, ge=1, le=RESULTS_MAX_PAGE_SIZE, description="Page size for format=json"),
+        source_url: str | None = Query(None, description="Only items scraped from this store page"),
+        q: str | None = Query(None, description="Only items whose name contains this text"),
+        min_price_cents: int | None = Query(None, ge=0),
+        max_price_cents: int | None = Query(None, ge=0),
+        fields: str | None = Query(None, description="Comma-separated columns to return, e.g. food_name,price"),
+        format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams every matching item"),
+):
+    """Endpoint to retrieve scraped results of the published snapshot, paginated or streamed."""
+    try:
+        columns = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Only the published snapshot is visible, so results stay consistent while a crawl runs
+    query = results_query(columns, after_id, source_url, q, min_price_cents, max_price_cents)
+    if format == "ndjson":
+        return StreamingResponse(stream_ndjson(query), media_type="application/x-ndjson")
+    return fetch_page(query, limit)
+
+
+@router.get("/cheapest")
+def get_cheapest(
+        unit: str = Query("kg", description="Unit to compare prices per: kg, l or piece (any known spelling)"),
+        q: str | None = Query(None, description="Only items whose name contains this text"),
+        limit: int = Query(20, ge=1, le=200),
+) -> dict:
+    """Endpoint to list the current offers with the lowest price per kilogram, liter or piece."""
+    normalized = normalize_quantity(1, unit)
+    if normalized is None:
+        raise HTTPException(status_code=400, detail=f"Unknown unit: {unit}")
+    base_unit = normalized[1]
+
     session = get_session()
     try:
-        items = session.query(FoodItemDB).all()
-        return {"items": [item.as_dict() for item in items]}
+        query = session.query(FoodItemDB).filter(
+            FoodItemDB.crawl_id == current_crawl_id_query(),
+            FoodItemDB.quantity_unit == base_unit,
+            FoodItemDB.unit_price_cents.isnot(None),
+        )
+        if q:
+            query = query.filter(FoodItemDB.food_name.ilike(f"%{q}%"))
+        items = query.order_by(FoodItemDB.unit_price_cents, FoodItemDB.id).limit(limit).all()
+        return {"unit": base_unit, "items": [item.as_dict() for item in items]}
     finally:
         session.close()
@@ -0,0 +1,146 @@
+"""Crawler worker process.
+
+Runs the Scrapy reactor in its own process and executes the crawls requested
+through /api/py/crawler/scrape, which are queued in the crawl_runs table:
+
+    python -m api.crawler_worker          # keep polling for requested crawls
+    python -m api.crawler_worker --once   # request one crawl, run it and exit
+
+Any number of workers may run; each requested crawl is claimed by exactly one.
+Each worker serves its metrics in the Prometheus text format on
+CRAWLER_METRICS_PORT (default 9410, 0 disables it).
+"""
+import argparse
+import logging
+import os
+import socket
+
+from scrapy.crawler import CrawlerRunner
+from scrapy.utils.log import configure_logging
+from twisted.internet import reactor, task, threads
+from twisted.web import resource, server
+
+from .logic.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
+from .logic.snapshots import (
+    claim_crawl_run,
+    fail_crawl_run,
+    heartbeat_crawl_run,
+    reap_stale_crawl_runs,
+    request_crawl_run,
+)
+from .spider import FoodCrawler, settings
+
+# How often an idle worker looks for requested crawls and a busy one reports that it is alive
+CRAWLER_POLL_SECONDS = float(os.getenv("CRAWLER_POLL_SECONDS", "5"))
+CRAWLER_HEARTBEAT_SECONDS = float(os.getenv("CRAWLER_HEARTBEAT_SECONDS", "15"))
+CRAWLER_METRICS_PORT = int(os.getenv("CRAWLER_METRICS_PORT", "9410"))
+
+logger = logging.getLogger("meal_planner_api.crawler_worker")
+
+
+class MetricsResource(resource.Resource):
+    """Serves the worker's metrics from the reactor thread."""
+
+    isLeaf = True
+
+    def render_GET(self, request):
+        request.setHeader(b"Content-Type", METRICS_CONTENT_TYPE.encode())
+        return render_metrics()
+
+
+class CrawlerWorker:
+    """Claims requested crawls from the database and runs them one at a time."""
+
+    def __init__(self, once: bool = False):
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.once = once
+        self.runner = CrawlerRunner(settings)
+        self.crawl_id = None
+        self._claiming = False
+        self._poller = task.LoopingCall(self.poll)
+        self._heartbeat = None
+
+    def start(self) -> None:
+        self._poller.start(CRAWLER_POLL_SECONDS)
+        reactor.addSystemEventTrigger("before", "shutdown", self.shutdown)
+
+    def poll(self) -> None:
+        if self.crawl_id is not None or self._claiming:
+            return
+        self._claiming = True
+        deferred = threads.deferToThread(self._claim)
+        deferred.addCallback(self._start_crawl)
+        deferred.addErrback(lambda failure: logger.error(f"Claiming a crawl failed: {failure.getErrorMessage()}"))
+        deferred.addBoth(self._claimed)
+
+    def _claim(self) -> int | None:
+        for crawl_id in reap_stale_crawl_runs():
+            logger.warning(f"Failed crawl {crawl_id}: it was never claimed or its worker stopped sending heartbeats")
+        return claim_crawl_run(self.name)
+
+    def _claimed(self, _) -> None:
+        self._claiming = False
+
+    def _start_crawl(self, crawl_id: int | None) -> None:
+        if crawl_id is None:
+            if self.once:
+                logger.info("No crawl to run")
+                reactor.stop()
+            return
+        logger.info(f"Worker {self.name} starting crawl {crawl_id}")
+        self.crawl_id = crawl_id
+        self._heartbeat = task.LoopingCall(self._send_heartbeat, crawl_id)
+        self._heartbeat.start(CRAWLER_HEARTBEAT_SECONDS)
+        deferred = self.runner.crawl(FoodCrawler, crawl_id=crawl_id)
+        deferred.addBoth(self._finish_crawl, crawl_id)
+
+    def _send_heartbeat(self, crawl_id: int):
+        deferred = threads.deferToThread(heartbeat_crawl_run, crawl_id)
+        # Keep the heartbeat loop alive through transient database errors
+        deferred.addErrback(lambda failure: logger.error(f"Heartbeat failed: {failure.getErrorMessage()}"))
+        return deferred
+
+    def _finish_crawl(self, result, crawl_id: int):
+        if self._heartbeat is not None and self._heartbeat.running:
+            self._heartbeat.stop()
+        if hasattr(result, "getErrorMessage"):
+            logger.error(f"Crawl {crawl_id} failed: {result.getErrorMessage()}")
+        # A crawl that ended without publishing its snapshot is discarded; readers keep the previous one
+        deferred = threads.deferToThread(fail_crawl_run, crawl_id)
+        deferred.addErrback(lambda failure: logger.error(f"Discarding crawl {crawl_id} failed: {failure.getErrorMessage()}"))
+
+        def done(_):
+            logger.info(f"Worker {self.name} finished crawl {crawl_id}")
+            self.crawl_id = None
+            if self.once:
+                reactor.stop()
+
+        return deferred.addBoth(done)
+
+    def shutdown(self):
+        """Stop a running crawl before the reactor exits, so its run is not left behind as running."""
+        if self._poller.running:
+            self._poller.stop()
+        crawl_id = self.crawl_id
+        if crawl_id is None:
+            return None
+        return self.runner.stop().addBoth(lambda _: threads.deferToThread(fail_crawl_run, crawl_id))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run requested food offer crawls")
+    parser.add_argument("--once", action="store_true", help="request a crawl, run it and exit")
+    args = parser.parse_args()
+
+    configure_logging(settings)
+    if args.once and request_crawl_run() is None:
+        logger.info("A crawl is already requested or running; running it if it is unclaimed")
+
+    if CRAWLER_METRICS_PORT:
+        reactor.listenTCP(CRAWLER_METRICS_PORT, server.Site(MetricsResource()))
+    CrawlerWorker(once=args.once).start()
+    reactor.run()
+
+
+if __name__ == "__main__":
+    main()
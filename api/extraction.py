@@ -0,0 +1,111 @@
+import logging
+import os
+import time
+from queue import Queue
+from threading import Lock, Thread
+from typing import Callable
+
+logger = logging.getLogger("meal_planner_api.extraction")
+
+# Number of concurrent LLM extraction workers and raw pages allowed to wait for them
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "4"))
+EXTRACTION_QUEUE_SIZE = int(os.getenv("EXTRACTION_QUEUE_SIZE", "16"))
+
+_STOP = object()
+
+
+class StageStats:
+    """Throughput counters for one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pages = 0
+        self.items = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.started = time.monotonic()
+        self.finished = None
+        self._lock = Lock()
+
+    def record(self, items: int = 0, busy_seconds: float = 0.0, error: bool = False) -> None:
+        with self._lock:
+            self.pages += 1
+            self.items += items
+            self.errors += int(error)
+            self.busy_seconds += busy_seconds
+
+    def finish(self) -> None:
+        self.finished = time.monotonic()
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            elapsed = (self.finished or time.monotonic()) - self.started
+            return {
+                "stage": self.name,
+                "pages": self.pages,
+                "items": self.items,
+                "errors": self.errors,
+                "elapsed_seconds": elapsed,
+                "busy_seconds": self.busy_seconds,
+                "pages_per_second": self.pages / elapsed if elapsed else 0.0,
+            }
+
+
+class ExtractionStage:
+    """Bounded queue of raw pages drained by a pool of LLM extraction threads.
+
+    put() blocks when the queue is full, which is how backpressure reaches the
+    producer. Pages are dicts with at least a 'source_url'. Each worker calls
+    extract(page) and hands the result to sink(page, items), where items is None
+    for pages that need no update; on_done() is called after every page, even a
+    failed one.
+    """
+
+    def __init__(
+            self,
+            extract: Callable[[dict], list | None],
+            sink: Callable[[dict, list | None], None],
+            on_done: Callable[[], None] | None = None,
+            workers: int = EXTRACTION_WORKERS,
+            queue_size: int = EXTRACTION_QUEUE_SIZE,
+    ):
+        self.extract = extract
+        self.sink = sink
+        self.on_done = on_done
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue = Queue(maxsize=queue_size)
+        self._threads = []
+        self.stats = StageStats("extract")
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            thread = Thread(target=self._work, name=f"extract-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, page: dict) -> None:
+        self._queue.put(page)
+
+    def close(self) -> dict:
+        """Wait for queued pages to be processed, stop the workers and return the stage stats."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self.stats.finish()
+        return self.stats.as_dict()
+
+    def _work(self) -> None:
+        while (page := self._queue.get()) is not _STOP:
+            started = time.perf_counter()
+            try:
+                items = self.extract(page)
+                self.sink(page, items)
+                self.stats.record(len(items or []), time.perf_counter() - started)
+            except Exception:
+                logger.exception(f"Extraction failed for {page['source_url']}")
+                self.stats.record(busy_seconds=time.perf_counter() - started, error=True)
+            finally:
+                if self.on_done:
+                    self.on_done()
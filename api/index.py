@@ -1,26 +1,41 @@
-import base64
-import hashlib
 import json
 import logging
 import os
-import shutil
-import tempfile
+from datetime import datetime
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, Response
+from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, Request, Response, Query, Body, Header
 from fastapi.middleware.cors import CORSMiddleware
-from google import genai
-from google.genai import types
-from sqlalchemy import desc
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-
+from sqlalchemy.orm.exc import StaleDataError
+
+from .analysis import (
+    ANALYSIS_STAGE_SECONDS,
+    VIDEO_ANALYSIS_OPERATION,
+    analysis_cache_stats,
+    analysis_etag,
+    plan_document,
+    is_cached_analysis,
+    latest_plan_cache,
+    load_meal_plan,
+    run_analysis_job,
+)
 from .crawler import router as crawler_router
+from .jobs import DONE, JobQueueFull, create_job, get_job, submit_or_join_job
+from .llm import GEMINI_API_KEY, get_gateway
 # Import database models
-from .logic.database import get_db, VideoAnalysis, OperationStatus, init_db
+from .logic.database import dispose_engines, get_async_db, get_db, VideoAnalysis, OperationStatus, init_db
+from .logic.etags import etag_matches, etag_matches_strong
+from .logic.matching import get_offer_index, match_ingredients
+from .logic.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, mark_process_dead, render_metrics
 # Import Pydantic models
 from .logic.models import MealPlan, MealPlanUpdate
-
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", None)
+from .logic.patch import PatchError, PatchTestFailed, apply_json_patch, apply_merge_patch, validate_changed
+from .logic.uploads import spool_upload, remove_spooled_file
 
 load_dotenv()
 
@@ -41,14 +56,28 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so the recorded latency includes the other middleware
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(crawler_router, prefix="/api/py/crawler", tags=["crawler"])
 
 
-# Initialize database tables on startup
+# Create and upgrade the tables on startup. Serverless deployments should run
+# python -m api.logic.create_tables once instead and set DB_INIT_ON_STARTUP=false,
+# so a cold start does not open a connection before the first request needs one
+DB_INIT_ON_STARTUP = os.getenv("DB_INIT_ON_STARTUP", "true").lower() == "true"
+
+
 @app.on_event("startup")
 def startup_db_client():
-    init_db()
+    if DB_INIT_ON_STARTUP:
+        init_db()
+
+
+@app.on_event("shutdown")
+async def shutdown_db_client():
+    await dispose_engines()
+    mark_process_dead()
 
 
 @app.get("/")
@@ -64,7 +93,7 @@ async def hello():
 @app.post("/api/py/update-meal-plan")
 async def update_meal_plan(
         meal_plan: MealPlanUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
 ):
     """
     Update an existing meal plan in the most recent video analysis
@@ -73,13 +102,13 @@ async def update_meal_plan(
 
     try:
         # Log the incoming meal plan data
-        logger.info(f"Meal plan update request received with data: {meal_plan.dict(exclude_none=True)}")
+        logger.info(f"Meal plan update request received with {len(meal_plan.meal_plan)} characters of plan JSON")
 
         # Get the most recent analysis
         meal_plan_obj = MealPlan.model_validate_json(meal_plan.meal_plan)
         logger.info("Successfully validated meal plan data")
 
-        latest_analysis = db.query(VideoAnalysis).order_by(desc(VideoAnalysis.created_at)).first()
+        latest_analysis = await db.scalar(select(VideoAnalysis).order_by(desc(VideoAnalysis.created_at)).limit(1))
 
         if not latest_analysis:
             logger.warning("No existing meal plan found to update")
@@ -88,14 +117,15 @@ async def update_meal_plan(
         logger.info(f"Found existing analysis to update: id={latest_analysis.id}, filename={latest_analysis.filename}")
 
         # Log meal plan structure before update
-        logger.info(f"Original meal plan structure: {latest_analysis.analysis_text[:100]}...")
+        logger.info(f"Original meal plan structure: {json.dumps(plan_document(latest_analysis))[:100]}...")
 
         # Update the analysis_text with the new meal plan
         new_meal_plan_json = meal_plan_obj.model_dump_json()
-        latest_analysis.analysis_text = new_meal_plan_json
+        latest_analysis.analysis_text = meal_plan_obj.model_dump(mode="json")
         logger.info(f"Updated meal plan structure: {new_meal_plan_json[:100]}...")
 
-        db.commit()
+        await db.commit()
+        latest_plan_cache.invalidate()
         logger.info("Successfully committed meal plan update to database")
 
         return {"message": "Meal plan updated successfully"}
@@ -117,11 +147,60 @@ async def update_meal_plan(
         )
 
 
-@app.post("/api/py/analyze-video", response_model=MealPlan)
+@app.patch("/api/py/meal-plan")
+async def patch_meal_plan(
+        patch: list[dict] | dict = Body(
+            ...,
+            description="RFC 6902 JSON Patch operations (array) or an RFC 7396 merge patch (object)",
+        ),
+        if_match: str | None = Header(None, description="ETag of the plan the patch was made against"),
+        db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Apply a partial update to the most recent meal plan, validating only the changed parts
+    """
+    latest_analysis = await db.scalar(select(VideoAnalysis).order_by(desc(VideoAnalysis.created_at)).limit(1))
+    if not latest_analysis:
+        raise HTTPException(status_code=404, detail="No meal plan found to update")
+
+    if if_match and not etag_matches_strong(if_match, analysis_etag(latest_analysis)):
+        raise HTTPException(status_code=412, detail="Meal plan was modified, reload it and retry")
+
+    try:
+        document = plan_document(latest_analysis)
+        if isinstance(patch, list):
+            document, changed = apply_json_patch(document, patch)
+        else:
+            document, changed = apply_merge_patch(document, patch)
+        validate_changed(MealPlan, document, changed)
+    except PatchTestFailed as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except (PatchError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # The version column is checked in the UPDATE, so a concurrent edit makes this commit fail
+    latest_analysis.analysis_text = document
+    try:
+        await db.commit()
+    except StaleDataError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Meal plan was modified concurrently, reload it and retry")
+    latest_plan_cache.invalidate()
+    logger.info(f"Patched meal plan {latest_analysis.id} at {len(changed)} paths, version {latest_analysis.version}")
+
+    return JSONResponse(
+        {"message": "Meal plan updated successfully", "version": latest_analysis.version},
+        headers={"ETag": analysis_etag(latest_analysis)},
+    )
+
+
+@app.post("/api/py/analyze-video", status_code=202)
 async def analyze_video(
         video: UploadFile = File(...),
-        db: Session = Depends(get_db),
+        force: bool = Query(False, description="Re-run the analysis even if a cached result exists"),
+        db: AsyncSession = Depends(get_async_db),
 ):
+    """Spool and hash the upload, then queue the analysis and return its job id"""
     temp_video_path = None
     try:
         if not GEMINI_API_KEY:
@@ -130,106 +209,48 @@ async def analyze_video(
         if not video.content_type or not video.content_type.startswith("video/"):
             raise HTTPException(status_code=400, detail="File must be a video")
 
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(
-                delete=False, suffix=os.path.splitext(video.filename)[1]
-        ) as temp_video:
-            shutil.copyfileobj(video.file, temp_video)
-            temp_video_path = temp_video.name
-
-        # Calculate SHA-256 hash of the file
-        sha256_hash = hashlib.sha256()
-        with open(temp_video_path, "rb") as f:
-            # Read and update hash in chunks to handle large files
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        file_hash = sha256_hash.hexdigest()
-
-        # Initialize Gemini client
-        client = genai.Client(api_key=GEMINI_API_KEY)
-
-        # Read the video file and encode it
-        with open(temp_video_path, "rb") as f:
-            video_bytes = f.read()
-            video_base64 = base64.b64encode(video_bytes).decode("utf-8")
-
-        # Define the output structure - now in the prompt
-        prompt = """
-        Analyze this video showing food items and create a simple meal plan.
-        
-        Based on the food items visible in the video, generate:
-        1. ONE meal per day for each day of the week (Monday to Sunday)
-        2. For each meal, provide a simple recipe with ingredients list and basic instructions
-        3. A shopping list with any additional ingredients needed that weren't shown in the video
-        
-        Keep everything simple and straightforward.
-        """
-
-        # Create content with video data
-        contents = [
-            types.Content(
-                role="user",
-                parts=[
-                    types.Part.from_text(text=prompt),
-                    types.Part(
-                        inline_data=types.Blob(
-                            mime_type=video.content_type,
-                            data=video_bytes
-                        )
-                    ),
-                ],
-            ),
-        ]
-
-        # Generate content with temperature=0 and JSON response type
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=contents,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                temperature=0,
-                response_schema=MealPlan
+        # Spool the upload to disk and hash it in one streaming pass
+        with ANALYSIS_STAGE_SECONDS.labels(stage="spool").time():
+            temp_video_path, file_hash, video_size = await spool_upload(video)
+        logger.info(f"Spooled upload {video.filename}: {video_size} bytes, sha256={file_hash}")
+
+        job_fields = dict(file_hash=file_hash, filename=video.filename, content_type=video.content_type)
+
+        # Return the stored plan when this exact video was already analyzed with the same prompt and model
+        with ANALYSIS_STAGE_SECONDS.labels(stage="cache_lookup").time():
+            existing_analysis = await db.get(VideoAnalysis, file_hash)
+        if not force and is_cached_analysis(existing_analysis):
+            analysis_cache_stats.hit()
+            logger.info(f"Analysis cache hit for sha256={file_hash}")
+            # Bump the timestamp so the re-uploaded video becomes the latest analysis again
+            existing_analysis.created_at = datetime.utcnow()
+            job = await create_job(db, VIDEO_ANALYSIS_OPERATION, status=DONE, **job_fields)
+            latest_plan_cache.invalidate()
+            return job.as_dict()
+        analysis_cache_stats.miss()
+
+        # Identical uploads in flight (double clicks, client retries) share one job and one Gemini call
+        video_path = temp_video_path
+        with ANALYSIS_STAGE_SECONDS.labels(stage="enqueue").time():
+            job, joined = await submit_or_join_job(
+                db,
+                VIDEO_ANALYSIS_OPERATION,
+                lambda job_db, job_row: run_analysis_job(job_db, job_row, video_path),
+                **job_fields,
             )
-        )
-
-        # Get the meal plan data
-        meal_plan_data = response.parsed.model_dump()
-
-        # Check if analysis with this hash already exists
-        existing_analysis = db.query(VideoAnalysis).filter(VideoAnalysis.id == file_hash).first()
-
-        # If analysis exists, delete it
-        if existing_analysis:
-            db.delete(existing_analysis)
-            db.commit()
-
-        # Create new analysis using file hash as ID
-        analysis = VideoAnalysis(
-            id=file_hash,
-            filename=video.filename,
-            content_type=video.content_type,
-            prompt=prompt,
-            analysis_text=json.dumps(meal_plan_data),
-        )
-
-        db.add(analysis)
-        db.commit()
-        db.refresh(analysis)
+        if joined:
+            logger.info(f"Joined analysis job {job.job_id} already in flight for sha256={file_hash}")
+            return job.as_dict()
 
-        if os.path.exists(temp_video_path):
-            os.unlink(temp_video_path)
-
-        # Convert back to MealPlan object
-        return MealPlan.model_validate(meal_plan_data)
+        # The worker owns the spooled file from here on and removes it when done
+        temp_video_path = None
+        logger.info(f"Queued analysis job {job.job_id} for sha256={file_hash}")
+        return job.as_dict()
 
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        error_message = f"Error in analyze_video: {str(e)}"
-        print(f"ERROR: {error_message}")
-        import traceback
-        print(traceback.format_exc())
-
-        if os.path.exists(temp_video_path):
-            os.unlink(temp_video_path)
+        logger.exception(f"Error in analyze_video: {str(e)}")
 
         # Return detailed error response
         raise HTTPException(
@@ -240,12 +261,37 @@ async def analyze_video(
                 "type": str(type(e).__name__)
             }
         )
+    finally:
+        remove_spooled_file(temp_video_path)
+
+
+@app.get("/api/py/analysis-cache/stats")
+def get_analysis_cache_stats():
+    """Return hit/miss counters of the video analysis cache for this process"""
+    return analysis_cache_stats.as_dict()
+
+
+@app.get("/api/py/metrics")
+def get_metrics():
+    """Return the metrics of this process in the Prometheus text format"""
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/api/py/llm/stats")
+def get_llm_stats():
+    """Return per-operation latency, retry and token counters of the Gemini gateway"""
+    return get_gateway().stats()
 
 
 @app.get("/api/py/is-done")
-def is_done(db: Session = Depends(get_db)):
-    # Query the operation status table to check if video analysis is done
-    status = db.query(OperationStatus).filter(OperationStatus.operation_type == "video_analysis").first()
+async def is_done(db: AsyncSession = Depends(get_async_db)):
+    """Report whether the most recently updated video analysis (job or manual flag) is done"""
+    status = await db.scalar(
+        select(OperationStatus)
+        .where(OperationStatus.operation_type == VIDEO_ANALYSIS_OPERATION)
+        .order_by(desc(OperationStatus.updated_at))
+        .limit(1)
+    )
 
     if not status:
         # If no status exists, return false
@@ -254,24 +300,59 @@ def is_done(db: Session = Depends(get_db)):
     return {"is_done": status.is_done}
 
 
-@app.get("/api/py/analysis", response_model=MealPlan)
-def get_latest_analysis(db: Session = Depends(get_db)):
-    """Get the most recent video analysis"""
-    analysis = db.query(VideoAnalysis).order_by(desc(VideoAnalysis.created_at)).first()
+@app.get("/api/py/is-done/{job_id}")
+async def get_job_status(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Return status, timings and, once finished, the meal plan of an analysis job"""
+    job = await get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
 
-    if not analysis:
-        raise HTTPException(status_code=404, detail="No analysis found")
+    result = job.as_dict()
+    if job.status == DONE:
+        analysis = await db.get(VideoAnalysis, job.file_hash)
+        result["result"] = load_meal_plan(analysis) if analysis else None
+    return result
 
-    # Parse the JSON string from the database
+
+@app.get("/api/py/analysis", response_model=MealPlan)
+def get_latest_analysis(request: Request):
+    """Get the most recent video analysis; answers 304 when the client's ETag is still current"""
     try:
-        # Return as MealPlan object
-        return MealPlan.model_validate(json.loads(analysis.analysis_text))
+        cached = latest_plan_cache.get()
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error parsing meal plan data: {str(e)}"
         )
 
+    if not cached:
+        raise HTTPException(status_code=404, detail="No analysis found")
+
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/py/shopping-list/offers")
+def get_shopping_list_offers(
+        limit: int = Query(3, ge=1, le=20, description="Offers returned per ingredient"),
+        db: Session = Depends(get_db),
+):
+    """Match every shopping list item of the latest meal plan to the best offers of the current crawl"""
+    analysis = db.query(VideoAnalysis).order_by(desc(VideoAnalysis.created_at)).first()
+    if not analysis:
+        raise HTTPException(status_code=404, detail="No analysis found")
+
+    meal_plan = load_meal_plan(analysis)
+    index = get_offer_index(db)
+    return {
+        "crawl_id": index.crawl_id,
+        "offers_indexed": len(index.offers),
+        "items": match_ingredients(index, meal_plan.shopping_list.items, limit),
+    }
+
 
 @app.post("/api/py/set-status/{status}")
 def set_status(status: str, db: Session = Depends(get_db)):
@@ -279,12 +360,16 @@ def set_status(status: str, db: Session = Depends(get_db)):
     if status not in ["true", "false"]:
         raise HTTPException(status_code=400, detail="Status must be 'true' or 'false'")
 
-    operation_status = db.query(OperationStatus).filter(OperationStatus.operation_type == "video_analysis").first()
+    operation_status = (
+        db.query(OperationStatus)
+        .filter(OperationStatus.operation_type == VIDEO_ANALYSIS_OPERATION, OperationStatus.job_id.is_(None))
+        .first()
+    )
 
     if operation_status:
         operation_status.is_done = status
     else:
-        operation_status = OperationStatus(operation_type="video_analysis", is_done=status)
+        operation_status = OperationStatus(operation_type=VIDEO_ANALYSIS_OPERATION, is_done=status)
         db.add(operation_status)
 
     db.commit()
@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import os
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import BoundedSemaphore
+from typing import Callable
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .logic.database import OperationStatus, SessionLocal, get_engine
+from .logic.metrics import DEFAULT_BUCKETS
+
+logger = logging.getLogger("meal_planner_api.jobs")
+
+# Number of jobs executed concurrently and number of jobs allowed to wait or run at once
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "32"))
+# A job queued or running for longer than this is assumed lost with the process that ran it
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "1800"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+JOB_QUEUE_SECONDS = Histogram(
+    "job_queue_seconds", "Time jobs waited for a worker", ("operation",), buckets=DEFAULT_BUCKETS,
+)
+JOB_RUN_SECONDS = Histogram(
+    "job_run_seconds", "Time jobs ran, by final status", ("operation", "status"), buckets=DEFAULT_BUCKETS,
+)
+# Summed over the live workers in multiprocess mode
+JOBS_PENDING = Gauge("jobs_pending", "Jobs queued or running", multiprocess_mode="livesum")
+JOBS_JOINED = Counter("jobs_joined_total", "Submissions that joined a queued or running job for the same content", ("operation",))
+
+executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_pending_slots = BoundedSemaphore(JOB_MAX_PENDING)
+# Submissions in progress in this process, keyed by (operation_type, file_hash); resolve to the job id
+_inflight: dict[tuple[str, str], asyncio.Future] = {}
+
+
+class JobQueueFull(Exception):
+    """Raised when no more jobs can be accepted until running ones finish."""
+
+
+async def create_job(db: AsyncSession, operation_type: str, status: str = QUEUED, **fields) -> OperationStatus:
+    """Persist a new job row and return it."""
+    now = datetime.utcnow()
+    job = OperationStatus(
+        job_id=str(uuid.uuid4()),
+        operation_type=operation_type,
+        status=status,
+        is_done="true" if status in (DONE, FAILED) else "false",
+        created_at=now,
+        **fields,
+    )
+    if status in (DONE, FAILED):
+        job.started_at = job.finished_at = now
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def submit_job(
+        db: AsyncSession,
+        operation_type: str,
+        func: Callable[[Session, OperationStatus], None],
+        **fields,
+) -> OperationStatus:
+    """Create a queued job and schedule func(session, job) on the worker pool.
+
+    The function runs with its own database session; the job is marked done when
+    it returns and failed when it raises. Raises JobQueueFull when the pool is saturated.
+    """
+    if not _pending_slots.acquire(blocking=False):
+        raise JobQueueFull(f"{JOB_MAX_PENDING} jobs are already pending")
+    # Counted with the slot, so the worker's decrement can never run before the increment
+    JOBS_PENDING.inc()
+    try:
+        job = await create_job(db, operation_type, **fields)
+        executor.submit(_run_job, job.job_id, func)
+    except Exception:
+        _pending_slots.release()
+        JOBS_PENDING.dec()
+        raise
+    return job
+
+
+async def get_job(db: AsyncSession, job_id: str) -> OperationStatus | None:
+    return await db.scalar(select(OperationStatus).where(OperationStatus.job_id == job_id))
+
+
+async def find_active_job(db: AsyncSession, operation_type: str, file_hash: str) -> OperationStatus | None:
+    """Return the queued or running job for this content, if any.
+
+    A job active for longer than JOB_STALE_SECONDS is marked failed instead, so a
+    process that died mid-job cannot keep its video from being analyzed again.
+    """
+    job = await db.scalar(
+        select(OperationStatus).where(
+            OperationStatus.operation_type == operation_type,
+            OperationStatus.file_hash == file_hash,
+            OperationStatus.status.in_((QUEUED, RUNNING)),
+        )
+    )
+    if job is None:
+        return None
+
+    now = datetime.utcnow()
+    active_since = job.started_at or job.created_at
+    if now - active_since > timedelta(seconds=JOB_STALE_SECONDS):
+        logger.warning(f"Failing stale job {job.job_id}, {job.status} since {active_since}")
+        job.error = f"Abandoned: still {job.status} after {JOB_STALE_SECONDS:.0f}s"
+        job.status = FAILED
+        job.is_done = "true"
+        job.finished_at = now
+        await db.commit()
+        return None
+    return job
+
+
+async def submit_or_join_job(
+        db: AsyncSession,
+        operation_type: str,
+        func: Callable[[Session, OperationStatus], None],
+        file_hash: str,
+        **fields,
+) -> tuple[OperationStatus, bool]:
+    """Submit a job for file_hash unless one for the same content is already queued or running.
+
+    Returns (job, joined); a joined job belongs to an earlier request, whose result the
+    caller shares instead of running func itself. Concurrent callers in this process wait
+    for the first one's submission. Across processes a partial unique index on queued and
+    running jobs lets exactly one insert win; the others join its job.
+    """
+    key = (operation_type, file_hash)
+    submission = _inflight.get(key)
+    if submission is not None:
+        # Shielded, so a cancelled follower does not cancel the submission it waits for
+        job_id = await asyncio.shield(submission)
+        job = await get_job(db, job_id) if job_id else None
+        if job is not None:
+            JOBS_JOINED.labels(operation=operation_type).inc()
+            return job, True
+
+    submission = asyncio.get_running_loop().create_future()
+    _inflight.setdefault(key, submission)
+    job_id = None
+    try:
+        job, joined = await _submit_or_join(db, operation_type, func, file_hash, **fields)
+        job_id = job.job_id
+        if joined:
+            JOBS_JOINED.labels(operation=operation_type).inc()
+        return job, joined
+    finally:
+        # Followers of a failed submission get None and try for themselves
+        submission.set_result(job_id)
+        if _inflight.get(key) is submission:
+            del _inflight[key]
+
+
+async def _submit_or_join(
+        db: AsyncSession,
+        operation_type: str,
+        func: Callable[[Session, OperationStatus], None],
+        file_hash: str,
+        **fields,
+) -> tuple[OperationStatus, bool]:
+    # Bounded, since each lost race means another process's job became active in between
+    for _ in range(3):
+        job = await find_active_job(db, operation_type, file_hash)
+        if job is not None:
+            return job, True
+        try:
+            return await submit_job(db, operation_type, func, file_hash=file_hash, **fields), False
+        except IntegrityError:
+            # Another process queued the same content between the lookup and the insert
+            await db.rollback()
+    raise RuntimeError(f"Could not submit or join a {operation_type} job for {file_hash}")
+
+
+def _run_job(job_id: str, func: Callable[[Session, OperationStatus], None]) -> None:
+    db = SessionLocal(bind=get_engine())
+    try:
+        job = db.query(OperationStatus).filter(OperationStatus.job_id == job_id).one()
+        job.status = RUNNING
+        job.started_at = datetime.utcnow()
+        db.commit()
+
+        try:
+            func(db, job)
+            job.status = DONE
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}\n{traceback.format_exc()}")
+            db.rollback()
+            job.status = FAILED
+            job.error = f"{type(e).__name__}: {e}"
+
+        job.is_done = "true"
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        JOB_QUEUE_SECONDS.labels(operation=job.operation_type).observe((job.started_at - job.created_at).total_seconds())
+        JOB_RUN_SECONDS.labels(operation=job.operation_type, status=job.status).observe(
+            (job.finished_at - job.started_at).total_seconds(),
+        )
+    finally:
+        db.close()
+        _pending_slots.release()
+        JOBS_PENDING.dec()
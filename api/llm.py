@@ -0,0 +1,291 @@
+import importlib
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from threading import BoundedSemaphore, Lock
+from typing import Callable, Protocol
+
+from dotenv import load_dotenv
+
+from prometheus_client import Counter, Histogram
+
+from .logic.metrics import DEFAULT_BUCKETS
+
+load_dotenv()
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", None)
+
+# Gateway limits, tunable per deployment
+GEMINI_MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "8"))
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "120"))
+# How long to wait for an uploaded file to finish server-side processing
+GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS = float(os.getenv("GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS", "300"))
+GEMINI_FILE_POLL_INTERVAL_SECONDS = 2.0
+# Uploaded files are kept by Gemini for 48 hours; assume slightly less when no expiry is reported
+GEMINI_FILE_DEFAULT_TTL = timedelta(hours=47)
+
+# Optional "module:attribute" naming an LLMClient class or factory used instead of genai.Client,
+# e.g. the fake backend of the benchmark suite
+LLM_BACKEND = os.getenv("LLM_BACKEND")
+
+# HTTP status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+logger = logging.getLogger("meal_planner_api.llm")
+
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_seconds",
+    "Latency of single Gemini API attempts by operation and outcome (ok, retry or error)",
+    ("operation", "outcome"),
+    buckets=DEFAULT_BUCKETS,
+)
+LLM_RATE_LIMIT_WAIT_SECONDS = Counter(
+    "llm_rate_limit_wait_seconds_total", "Time Gemini calls waited for the gateway's token bucket", ("operation",),
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Gemini tokens by operation and kind (prompt or output)", ("operation", "kind"))
+
+
+class ModelsAPI(Protocol):
+    def generate_content(self, *, model: str, contents, config=None): ...
+
+
+class FilesAPI(Protocol):
+    def upload(self, *, file, config=None): ...
+
+    def get(self, *, name: str): ...
+
+
+class LLMClient(Protocol):
+    """The subset of genai.Client used by the gateway; fakes implement the same shape."""
+
+    models: ModelsAPI
+    files: FilesAPI
+
+
+class TokenBucket:
+    """Blocking token-bucket rate limiter that refills continuously."""
+
+    def __init__(self, rate_per_second: float, capacity: float):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns the time waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class CallStats:
+    """Latency, retry and token counters for one kind of LLM call."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.latency_seconds_total = 0.0
+        self.latency_seconds_max = 0.0
+        self.rate_limit_wait_seconds_total = 0.0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.total_tokens = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "latency_seconds_avg": self.latency_seconds_total / self.calls if self.calls else 0.0,
+            "latency_seconds_max": self.latency_seconds_max,
+            "rate_limit_wait_seconds_total": self.rate_limit_wait_seconds_total,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": self.total_tokens,
+        }
+
+
+class LLMGateway:
+    """Shared entry point for Gemini calls.
+
+    Owns one long-lived client (and so one connection pool), caps in-flight calls
+    with a semaphore, paces requests with a token bucket and retries rate-limit and
+    server errors with jittered exponential backoff.
+    """
+
+    def __init__(
+            self,
+            client: LLMClient | None = None,
+            max_in_flight: int = GEMINI_MAX_IN_FLIGHT,
+            requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+            max_retries: int = GEMINI_MAX_RETRIES,
+            base_delay: float = 1.0,
+            max_delay: float = 30.0,
+    ):
+        self._client = client
+        self._client_lock = Lock()
+        self._in_flight = BoundedSemaphore(max_in_flight)
+        self._bucket = TokenBucket(requests_per_minute / 60.0, capacity=max(1.0, max_in_flight))
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._stats: dict[str, CallStats] = {}
+        self._stats_lock = Lock()
+
+    @property
+    def client(self) -> LLMClient:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    # The SDK is imported on first use; it is a large share of the API's cold start
+                    from google import genai
+                    from google.genai import types
+
+                    self._client = genai.Client(
+                        api_key=GEMINI_API_KEY,
+                        http_options=types.HttpOptions(timeout=int(GEMINI_TIMEOUT_SECONDS * 1000)),
+                    )
+        return self._client
+
+    def generate_content(self, *, model: str, contents, config=None, operation: str = "generate_content"):
+        """Call models.generate_content through the concurrency, rate and retry limits."""
+        return self._call(
+            operation,
+            lambda: self.client.models.generate_content(model=model, contents=contents, config=config),
+        )
+
+    def upload_file(self, path: str, mime_type: str, operation: str = "upload_file"):
+        """Upload a local file with the files API and wait until it is ready to be referenced.
+
+        Returns (file handle, expiry time). The file is streamed from disk by the SDK.
+        """
+        from google.genai import types
+
+        uploaded = self._call(
+            operation,
+            lambda: self.client.files.upload(file=path, config=types.UploadFileConfig(mime_type=mime_type)),
+        )
+
+        deadline = time.monotonic() + GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS
+        while _file_state(uploaded) == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Uploaded file {uploaded.name} is still processing")
+            time.sleep(GEMINI_FILE_POLL_INTERVAL_SECONDS)
+            uploaded = self._call("get_file", lambda: self.client.files.get(name=uploaded.name))
+
+        if _file_state(uploaded) == "FAILED":
+            raise RuntimeError(f"Gemini failed to process uploaded file {uploaded.name}")
+
+        expires_at = getattr(uploaded, "expiration_time", None)
+        if expires_at is not None:
+            # Stored as naive UTC like every other timestamp in the database
+            expires_at = expires_at.replace(tzinfo=None) - (expires_at.utcoffset() or timedelta())
+        else:
+            expires_at = datetime.utcnow() + GEMINI_FILE_DEFAULT_TTL
+        return uploaded, expires_at
+
+    def _call(self, operation: str, func: Callable):
+        from google.genai import errors
+
+        attempt = 0
+        while True:
+            waited = self._bucket.acquire()
+            with self._in_flight:
+                started = time.perf_counter()
+                try:
+                    response = func()
+                except errors.APIError as e:
+                    error_code = e.code
+                    retryable = e.code in RETRYABLE_STATUS_CODES and attempt < self.max_retries
+                    self._record(operation, time.perf_counter() - started, waited, error=not retryable, retry=retryable)
+                    if not retryable:
+                        raise
+                except Exception:
+                    self._record(operation, time.perf_counter() - started, waited, error=True)
+                    raise
+                else:
+                    self._record(operation, time.perf_counter() - started, waited, response=response)
+                    return response
+
+            delay = self._backoff_delay(attempt)
+            logger.warning(f"Gemini {operation} failed with {error_code}; retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def _backoff_delay(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(max_delay, base * 2^attempt)]
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _record(self, operation: str, latency: float, waited: float, response=None, error=False, retry=False):
+        with self._stats_lock:
+            stats = self._stats.setdefault(operation, CallStats())
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.retries += int(retry)
+            stats.latency_seconds_total += latency
+            stats.latency_seconds_max = max(stats.latency_seconds_max, latency)
+            stats.rate_limit_wait_seconds_total += waited
+
+            usage = getattr(response, "usage_metadata", None)
+            if usage is not None:
+                stats.prompt_tokens += usage.prompt_token_count or 0
+                stats.output_tokens += usage.candidates_token_count or 0
+                stats.total_tokens += usage.total_token_count or 0
+
+        outcome = "error" if error else "retry" if retry else "ok"
+        LLM_CALL_SECONDS.labels(operation=operation, outcome=outcome).observe(latency)
+        LLM_RATE_LIMIT_WAIT_SECONDS.labels(operation=operation).inc(waited)
+        if usage is not None:
+            LLM_TOKENS.labels(operation=operation, kind="prompt").inc(usage.prompt_token_count or 0)
+            LLM_TOKENS.labels(operation=operation, kind="output").inc(usage.candidates_token_count or 0)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {operation: stats.as_dict() for operation, stats in self._stats.items()}
+
+
+def _file_state(file) -> str | None:
+    state = getattr(file, "state", None)
+    return getattr(state, "name", state)
+
+
+_gateway: LLMGateway | None = None
+_gateway_lock = Lock()
+
+
+def load_backend(spec: str) -> LLMClient:
+    """Instantiate the LLMClient named by a "module:attribute" spec."""
+    module_name, _, attribute = spec.partition(":")
+    factory = getattr(importlib.import_module(module_name), attribute)
+    return factory()
+
+
+def get_gateway() -> LLMGateway:
+    """Return the process-wide LLM gateway, creating it on first use."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway(client=load_backend(LLM_BACKEND) if LLM_BACKEND else None)
+    return _gateway
+
+
+def set_gateway(gateway: LLMGateway | None) -> None:
+    """Replace the process-wide gateway, e.g. with one wrapping a fake client."""
+    global _gateway
+    with _gateway_lock:
+        _gateway = gateway
@@ -0,0 +1,115 @@
+import logging
+import os
+import time
+from threading import Event, Lock, Thread
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy import Table, insert
+
+from .database import get_session
+from .metrics import DEFAULT_BUCKETS
+
+# A buffered writer flushes once it holds this many rows or its oldest row is this old
+BULK_FLUSH_ROWS = int(os.getenv("BULK_FLUSH_ROWS", "1000"))
+BULK_FLUSH_SECONDS = float(os.getenv("BULK_FLUSH_SECONDS", "2"))
+
+logger = logging.getLogger("meal_planner_api.bulk")
+
+FLUSH_DURATION = Histogram(
+    "db_bulk_flush_seconds", "Time per bulk insert flush, including the commit", ("table",), buckets=DEFAULT_BUCKETS,
+)
+FLUSHED_ROWS = Counter("db_bulk_rows_total", "Rows written by bulk insert flushes", ("table",))
+
+
+class BulkWriter:
+    """Buffer rows for one table and write them in batches.
+
+    Each flush opens one session and sends the whole buffer as a single executemany,
+    which SQLAlchemy turns into multi-row INSERT ... VALUES statements. Flushes happen
+    when the buffer reaches max_rows, when its oldest row is older than max_seconds,
+    and on close().
+    """
+
+    def __init__(self, table: Table, max_rows: int = BULK_FLUSH_ROWS, max_seconds: float = BULK_FLUSH_SECONDS):
+        self.table = table
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self._buffer: list[dict] = []
+        self._buffer_since = None
+        self._buffer_lock = Lock()
+        # Serializes flushes so batches reach the database in order
+        self._flush_lock = Lock()
+        self._closed = Event()
+        self._timer = Thread(target=self._flush_periodically, name=f"bulk-{table.name}", daemon=True)
+        self._timer.start()
+
+        self.rows_written = 0
+        self.flushes = 0
+        self.flush_seconds = 0.0
+
+    def add(self, rows: list[dict]) -> None:
+        with self._buffer_lock:
+            if not self._buffer:
+                self._buffer_since = time.monotonic()
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= self.max_rows
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write all buffered rows and return how many were written."""
+        with self._flush_lock:
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+                self._buffer_since = None
+            if not rows:
+                return 0
+
+            started = time.perf_counter()
+            session = get_session()
+            try:
+                session.execute(insert(self.table), rows)
+                session.commit()
+            except Exception:
+                # Keep the rows so the next flush, at the latest close(), retries them
+                with self._buffer_lock:
+                    self._buffer[:0] = rows
+                    self._buffer_since = self._buffer_since or time.monotonic()
+                raise
+            finally:
+                session.close()
+
+            elapsed = time.perf_counter() - started
+            self.rows_written += len(rows)
+            self.flushes += 1
+            self.flush_seconds += elapsed
+            FLUSH_DURATION.labels(table=self.table.name).observe(elapsed)
+            FLUSHED_ROWS.labels(table=self.table.name).inc(len(rows))
+            logger.info(f"Flushed {len(rows)} rows into {self.table.name} in {elapsed:.3f}s")
+            return len(rows)
+
+    def close(self) -> dict:
+        """Stop the timer, write the remaining rows and return the ingestion stats."""
+        self._closed.set()
+        self._timer.join()
+        self.flush()
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {
+            "table": self.table.name,
+            "rows": self.rows_written,
+            "flushes": self.flushes,
+            "flush_seconds": self.flush_seconds,
+            "rows_per_second": self.rows_written / self.flush_seconds if self.flush_seconds else 0.0,
+        }
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self.max_seconds / 4):
+            with self._buffer_lock:
+                due = self._buffer_since is not None and time.monotonic() - self._buffer_since >= self.max_seconds
+            if due:
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception(f"Periodic flush into {self.table.name} failed")
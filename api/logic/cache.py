@@ -0,0 +1,35 @@
+from threading import Lock
+
+from prometheus_client import Counter
+
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters for an in-process or database-backed cache."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+
+    def hit(self) -> None:
+        with self._lock:
+            self.hits += 1
+        CACHE_REQUESTS.labels(cache=self.name, result="hit").inc()
+
+    def miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+        CACHE_REQUESTS.labels(cache=self.name, result="miss").inc()
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
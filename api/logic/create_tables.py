@@ -1,11 +1,11 @@
-import asyncio
-from api.logic.database import init_db
+from api.logic.database import backfill_food_item_columns, init_db
 
-async def create_tables():
+def create_tables():
     """Initialize the database tables."""
     print("Creating database tables...")
-    await init_db()
+    init_db()
     print("Database tables created successfully!")
+    print(f"Backfilled typed price/quantity columns of {backfill_food_item_columns()} food items")
 
 if __name__ == "__main__":
-    asyncio.run(create_tables()) 
\ No newline at end of file
+    create_tables()
@@ -1,36 +1,104 @@
 import os
 from datetime import datetime
+from threading import Lock
 
 from dotenv import load_dotenv
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON
-from sqlalchemy import create_engine
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Index, Float
+from sqlalchemy import Engine, create_engine, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.orm import sessionmaker as sync_sessionmaker
 
+from .normalize import normalized_columns
+
 load_dotenv()
 
-# Get database URL from environment
-DATABASE_URL = os.getenv("POSTGRES_URL_NO_SSL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is not set")
+# Connection pool and logging settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Recycle connections before server-side or load-balancer idle timeouts close them
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Per-statement limit enforced by Postgres; 0 disables it
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
 
-# Fix the dialect prefix - SQLAlchemy requires postgresql:// not postgres://
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+# Engines are created on first use, so importing the models costs neither a database
+# driver import nor a connection pool; cold starts only pay for the engine a request needs
+_engine: Engine | None = None
+_async_engine: AsyncEngine | None = None
+_engine_lock = Lock()
 
-# Create synchronous engine instead of async, explicitly using psycopg2
-engine = create_engine(
-    DATABASE_URL,
-    echo=True,
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
 # Synchronous fallback for Scrapy integration
-SyncSessionLocal = sync_sessionmaker(bind=engine)
+SyncSessionLocal = sync_sessionmaker()
+
+# Objects stay usable after commit, since lazy refreshes are not possible without awaiting
+AsyncSessionLocal = async_sessionmaker(expire_on_commit=False, autoflush=False)
+
+
+def database_url() -> str:
+    # Get database URL from environment
+    url = os.getenv("POSTGRES_URL_NO_SSL")
+    if not url:
+        raise ValueError("DATABASE_URL environment variable is not set")
+    # Fix the dialect prefix - SQLAlchemy requires postgresql:// not postgres://
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def get_engine() -> Engine:
+    """Return the synchronous psycopg2 engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(
+                    database_url(),
+                    echo=DB_ECHO,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_timeout=DB_POOL_TIMEOUT,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=DB_POOL_PRE_PING,
+                    connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"},
+                )
+    return _engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """Return the asyncpg engine for the FastAPI endpoints, creating it on first use."""
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                _async_engine = create_async_engine(
+                    database_url().replace("postgresql://", "postgresql+asyncpg://", 1),
+                    echo=DB_ECHO,
+                    pool_size=DB_POOL_SIZE,
+                    max_overflow=DB_MAX_OVERFLOW,
+                    pool_timeout=DB_POOL_TIMEOUT,
+                    pool_recycle=DB_POOL_RECYCLE,
+                    pool_pre_ping=DB_POOL_PRE_PING,
+                    connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+                )
+    return _async_engine
+
+
+async def dispose_engines() -> None:
+    """Close the pools of the engines this process created."""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
 
 
 def get_session():
-    return SyncSessionLocal()
+    return SyncSessionLocal(bind=get_engine())
 
 
 Base = declarative_base()
@@ -43,13 +111,65 @@ class VideoAnalysis(Base):
     filename = Column(String(255), nullable=False)
     content_type = Column(String(100), nullable=False)
     prompt = Column(Text, nullable=True)
-    analysis_text = Column(JSON, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    model = Column(String(100), nullable=True)  # Gemini model that produced the analysis
+    analysis_text = Column(JSONB, nullable=False)  # meal plan document; rows written before JSONB may hold a JSON string
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # Bumped by every ORM update and checked in its WHERE clause (optimistic concurrency)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     def __repr__(self):
         return f"<VideoAnalysis {self.id}: {self.filename}>"
 
 
+class GeminiFile(Base):
+    """Handle of a video uploaded through the Gemini files API, reused until it expires"""
+    __tablename__ = "gemini_files"
+
+    file_hash = Column(String(64), primary_key=True)  # SHA-256 of the uploaded video
+    name = Column(String(255), nullable=False)  # e.g. files/abc123
+    uri = Column(Text, nullable=False)
+    mime_type = Column(String(100), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<GeminiFile {self.file_hash}: {self.name}>"
+
+
+class ExtractionCacheEntry(Base):
+    """Food items extracted from a page, keyed by its normalized text and the prompt version"""
+    __tablename__ = "extraction_cache"
+
+    key = Column(String(64), primary_key=True)  # SHA-256 of prompt version + normalized page text
+    prompt_version = Column(String(32), nullable=False)
+    items = Column(JSON, nullable=False)
+    hits = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_used_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ExtractionCacheEntry {self.key}: {len(self.items or [])} items>"
+
+
+class PageValidator(Base):
+    """HTTP validators and content hash of a crawled page, used for conditional re-crawls"""
+    __tablename__ = "page_validators"
+
+    url = Column(Text, primary_key=True)  # start URL the page was requested with
+    source_url = Column(Text, nullable=True)  # final URL after redirects, as stored on its items
+    etag = Column(Text, nullable=True)
+    last_modified = Column(Text, nullable=True)
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the preprocessed page text
+    crawl_id = Column(Integer, nullable=True)  # crawl that last stored items for this content
+    checked_at = Column(DateTime, default=datetime.utcnow)
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<PageValidator {self.url}: {self.content_hash}>"
+
+
 class OperationStatus(Base):
     __tablename__ = "operation_status"
 
@@ -58,19 +178,104 @@ class OperationStatus(Base):
     is_done = Column(String(5), default="false")
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Per-job fields; rows without a job_id are the legacy manually-toggled flag
+    job_id = Column(String(36), unique=True, index=True, nullable=True)
+    status = Column(String(20), nullable=True)  # queued, running, done or failed
+    file_hash = Column(String(64), index=True, nullable=True)
+    filename = Column(String(255), nullable=True)
+    content_type = Column(String(100), nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
     def __repr__(self):
         return f"<OperationStatus {self.id}: {self.operation_type} - {self.is_done}>"
 
+    def as_dict(self):
+        def seconds_between(start, end):
+            return (end - start).total_seconds() if start and end else None
+
+        return {
+            "job_id": self.job_id,
+            "operation_type": self.operation_type,
+            "status": self.status,
+            "is_done": self.is_done,
+            "file_hash": self.file_hash,
+            "filename": self.filename,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queue_seconds": seconds_between(self.created_at, self.started_at),
+            "run_seconds": seconds_between(self.started_at, self.finished_at),
+        }
+
+
+class CrawlRun(Base):
+    """One crawl, whose items form a snapshot of food_items"""
+    __tablename__ = "crawl_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    status = Column(String(20), nullable=False, default="running")  # requested, running, completed or failed
+    base_crawl_id = Column(Integer, nullable=True)  # snapshot that was current when the crawl started
+    item_count = Column(Integer, nullable=True)
+    stats = Column(JSON, nullable=True)
+    requested_at = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    # Crawler worker running this crawl and its last sign of life
+    worker = Column(String(255), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<CrawlRun {self.id}: {self.status}>"
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "base_crawl_id": self.base_crawl_id,
+            "item_count": self.item_count,
+            "requested_at": self.requested_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "worker": self.worker,
+            "heartbeat_at": self.heartbeat_at,
+        }
+
+
+class CrawlPointer(Base):
+    """Single row naming the snapshot readers see; swapped atomically when a crawl completes"""
+    __tablename__ = "crawl_pointer"
+
+    id = Column(Integer, primary_key=True, default=1)
+    current_crawl_id = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 class FoodItemDB(Base):
     __tablename__ = "food_items"
+    __table_args__ = (
+        Index("ix_food_items_crawl_id_id", "crawl_id", "id"),
+        Index("ix_food_items_crawl_id_source_url", "crawl_id", "source_url"),
+        Index("ix_food_items_crawl_id_unit_price", "crawl_id", "quantity_unit", "unit_price_cents"),
+        Index("ix_food_items_crawl_id_price_cents", "crawl_id", "price_cents"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    crawl_id = Column(Integer, ForeignKey("crawl_runs.id", ondelete="CASCADE"), nullable=True)
+    scraped_at = Column(DateTime, default=datetime.utcnow)
     source_url = Column(String)
     food_name = Column(String)
     food_item_description = Column(String)
     price = Column(String)
     quantity = Column(String)
+    # Typed columns parsed from price and quantity at ingestion (see logic/normalize.py)
+    price_cents = Column(Integer, nullable=True)
+    quantity_value = Column(Float, nullable=True)  # in quantity_unit
+    quantity_unit = Column(String(8), nullable=True)  # g, ml or piece
+    unit_price_cents = Column(Integer, nullable=True)  # per kg, per liter or per piece
 
     def __repr__(self):
         return f"<FoodItem {self.id}: {self.food_name}>"
@@ -78,23 +283,133 @@ class FoodItemDB(Base):
     def as_dict(self):
         return {
             "id": self.id,
+            "crawl_id": self.crawl_id,
+            "scraped_at": self.scraped_at,
             "source_url": self.source_url,
             "food_name": self.food_name,
             "food_item_description": self.food_item_description,
             "price": self.price,
-            "quantity": self.quantity
+            "quantity": self.quantity,
+            "price_cents": self.price_cents,
+            "quantity_value": self.quantity_value,
+            "quantity_unit": self.quantity_unit,
+            "unit_price_cents": self.unit_price_cents,
         }
 
 
+async def get_async_db():
+    """Dependency for getting an async DB session"""
+    async with AsyncSessionLocal(bind=get_async_engine()) as db:
+        yield db
+
+
 def get_db():
     """Dependency for getting DB session"""
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
     finally:
         db.close()
 
 
+# Idempotent upgrades for tables created by older versions; create_all never alters existing tables
+SCHEMA_UPGRADES = [
+    "ALTER TABLE video_analyses ADD COLUMN IF NOT EXISTS model VARCHAR(100)",
+    "CREATE INDEX IF NOT EXISTS ix_video_analyses_created_at ON video_analyses (created_at)",
+    "ALTER TABLE video_analyses ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    # Move meal plans from JSON to JSONB, then unwrap documents that were stored as a JSON string
+    "DO $$ BEGIN "
+    "IF (SELECT data_type FROM information_schema.columns "
+    "WHERE table_name = 'video_analyses' AND column_name = 'analysis_text') = 'json' THEN "
+    "ALTER TABLE video_analyses ALTER COLUMN analysis_text TYPE JSONB USING analysis_text::jsonb; "
+    "END IF; END $$",
+    "UPDATE video_analyses SET analysis_text = (analysis_text #>> '{}')::jsonb, version = version + 1 "
+    "WHERE jsonb_typeof(analysis_text) = 'string'",
+    "CREATE INDEX IF NOT EXISTS ix_video_analyses_analysis_text "
+    "ON video_analyses USING GIN (analysis_text jsonb_path_ops)",
+    "ALTER TABLE operation_status ADD COLUMN IF NOT EXISTS job_id VARCHAR(36)",
+    "ALTER TABLE operation_status ADD COLUMN IF NOT EXISTS status VARCHAR(20)",
+    "ALTER TABLE operation_status ADD COLUMN IF NOT EXISTS file_hash VARCHAR(64)",
+    "ALTER TABLE operation_status ADD COLUMN IF NOT EXISTS filename VARCHAR(255)",
+    "ALTER TABLE operation_status ADD COLUMN IF NOT EXISTS content_type VARCHAR(100)",
+    "ALTER TABLE operation_status ADD COLUMN IF NOT EXISTS error TEXT",
+    "ALTER TABLE operation_status ADD COLUMN IF NOT EXISTS created_at TIMESTAMP",
+    "ALTER TABLE operation_status ADD COLUMN IF NOT EXISTS started_at TIMESTAMP",
+    "ALTER TABLE operation_status ADD COLUMN IF NOT EXISTS finished_at TIMESTAMP",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_operation_status_job_id ON operation_status (job_id)",
+    "CREATE INDEX IF NOT EXISTS ix_operation_status_file_hash ON operation_status (file_hash)",
+    "ALTER TABLE page_validators ADD COLUMN IF NOT EXISTS crawl_id INTEGER",
+    "ALTER TABLE food_items ADD COLUMN IF NOT EXISTS crawl_id INTEGER REFERENCES crawl_runs (id) ON DELETE CASCADE",
+    "ALTER TABLE food_items ADD COLUMN IF NOT EXISTS scraped_at TIMESTAMP",
+    "CREATE INDEX IF NOT EXISTS ix_food_items_crawl_id_source_url ON food_items (crawl_id, source_url)",
+    "ALTER TABLE food_items ADD COLUMN IF NOT EXISTS price_cents INTEGER",
+    "ALTER TABLE food_items ADD COLUMN IF NOT EXISTS quantity_value DOUBLE PRECISION",
+    "ALTER TABLE food_items ADD COLUMN IF NOT EXISTS quantity_unit VARCHAR(8)",
+    "ALTER TABLE food_items ADD COLUMN IF NOT EXISTS unit_price_cents INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_food_items_crawl_id_unit_price "
+    "ON food_items (crawl_id, quantity_unit, unit_price_cents)",
+    "CREATE INDEX IF NOT EXISTS ix_food_items_crawl_id_price_cents ON food_items (crawl_id, price_cents)",
+    "CREATE INDEX IF NOT EXISTS ix_food_items_crawl_id_id ON food_items (crawl_id, id)",
+    "ALTER TABLE crawl_runs ADD COLUMN IF NOT EXISTS requested_at TIMESTAMP",
+    "ALTER TABLE crawl_runs ADD COLUMN IF NOT EXISTS worker VARCHAR(255)",
+    "ALTER TABLE crawl_runs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP",
+    # Runs left 'running' by the old in-process crawler never finish; without a heartbeat they are dead
+    "UPDATE crawl_runs SET status = 'failed', finished_at = now() WHERE status = 'running' AND heartbeat_at IS NULL",
+    # At most one crawl is requested or running at any time, across all API processes and workers
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_crawl_runs_one_active ON crawl_runs ((true)) "
+    "WHERE status IN ('requested', 'running')",
+    # At most one queued or running job per video, across all API processes; of duplicates
+    # queued before the index existed only the newest stays active
+    "UPDATE operation_status SET status = 'failed', is_done = 'true', finished_at = now(), "
+    "error = 'Superseded by a newer job for the same video' "
+    "WHERE status IN ('queued', 'running') AND file_hash IS NOT NULL AND id NOT IN ("
+    "SELECT max(id) FROM operation_status WHERE status IN ('queued', 'running') AND file_hash IS NOT NULL "
+    "GROUP BY operation_type, file_hash)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_operation_status_one_active ON operation_status (operation_type, file_hash) "
+    "WHERE status IN ('queued', 'running')",
+    # Adopt items written before snapshots existed as one completed snapshot and point readers at it
+    "INSERT INTO crawl_runs (status, item_count, started_at, finished_at) "
+    "SELECT 'completed', count(*), now(), now() FROM food_items WHERE crawl_id IS NULL HAVING count(*) > 0",
+    "UPDATE food_items SET crawl_id = (SELECT max(id) FROM crawl_runs) WHERE crawl_id IS NULL",
+    "INSERT INTO crawl_pointer (id, current_crawl_id, updated_at) "
+    "SELECT 1, max(id), now() FROM crawl_runs WHERE status = 'completed' ON CONFLICT (id) DO NOTHING",
+]
+
+
 def init_db():
     """Initialize the database with tables"""
+    engine = get_engine()
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+
+
+def backfill_food_item_columns(batch_size: int = 1000) -> int:
+    """Fill the typed price/quantity columns of rows ingested before they existed.
+
+    Returns the number of updated rows.
+    """
+    updated = 0
+    last_id = 0
+    session = get_session()
+    try:
+        while True:
+            rows = (
+                session.query(FoodItemDB.id, FoodItemDB.price, FoodItemDB.quantity)
+                .filter(FoodItemDB.id > last_id, FoodItemDB.price_cents.is_(None), FoodItemDB.quantity_unit.is_(None))
+                .order_by(FoodItemDB.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                return updated
+            session.bulk_update_mappings(
+                FoodItemDB,
+                [{"id": row.id, **normalized_columns(row.price, row.quantity)} for row in rows],
+            )
+            session.commit()
+            updated += len(rows)
+            last_id = rows[-1].id
+    finally:
+        session.close()
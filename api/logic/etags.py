@@ -0,0 +1,17 @@
+def parse_etags(header: str | None) -> list[str]:
+    """Split an If-None-Match / If-Match header into its entity tags."""
+    if not header:
+        return []
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def etag_matches(header: str | None, etag: str) -> bool:
+    """Weak comparison as used for If-None-Match: W/ prefixes are ignored and * matches anything."""
+    tags = parse_etags(header)
+    return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+
+def etag_matches_strong(header: str | None, etag: str) -> bool:
+    """Strong comparison as used for If-Match: weak tags never match and * matches anything."""
+    tags = parse_etags(header)
+    return "*" in tags or (not etag.startswith("W/") and etag in tags)
@@ -0,0 +1,77 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from .database import ExtractionCacheEntry, get_session
+
+# Entries older than the TTL are ignored and evicted; the table is trimmed to the newest entries
+EXTRACTION_CACHE_TTL = timedelta(hours=float(os.getenv("EXTRACTION_CACHE_TTL_HOURS", "168")))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "5000"))
+
+
+def cache_key(page_text: str, prompt_version: str) -> str:
+    """Hash normalized page text together with the prompt version."""
+    return hashlib.sha256(f"{prompt_version}\n{page_text}".encode()).hexdigest()
+
+
+def get_cached_items(key: str) -> list[dict] | None:
+    """Return the cached item dicts for key, or None when missing or expired."""
+    session = get_session()
+    try:
+        entry = session.get(ExtractionCacheEntry, key)
+        if entry is None or entry.created_at < datetime.utcnow() - EXTRACTION_CACHE_TTL:
+            return None
+        entry.hits += 1
+        entry.last_used_at = datetime.utcnow()
+        session.commit()
+        return entry.items
+    finally:
+        session.close()
+
+
+def store_items(key: str, prompt_version: str, items: list[dict]) -> None:
+    """Insert or refresh the cache entry for key.
+
+    An upsert, so workers extracting identical page text at the same time cannot collide on the key.
+    """
+    session = get_session()
+    try:
+        now = datetime.utcnow()
+        columns = dict(prompt_version=prompt_version, items=items, created_at=now, last_used_at=now)
+        session.execute(
+            insert(ExtractionCacheEntry)
+            .values(key=key, hits=0, **columns)
+            .on_conflict_do_update(index_elements=[ExtractionCacheEntry.key], set_=columns)
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def evict_entries() -> int:
+    """Delete expired entries and everything beyond the newest EXTRACTION_CACHE_MAX_ENTRIES.
+
+    Returns the number of deleted entries.
+    """
+    session = get_session()
+    try:
+        expired = session.query(ExtractionCacheEntry).filter(
+            ExtractionCacheEntry.created_at < datetime.utcnow() - EXTRACTION_CACHE_TTL
+        ).delete(synchronize_session=False)
+
+        overflow_keys = (
+            select(ExtractionCacheEntry.key)
+            .order_by(ExtractionCacheEntry.last_used_at.desc())
+            .offset(EXTRACTION_CACHE_MAX_ENTRIES)
+        )
+        overflow = session.query(ExtractionCacheEntry).filter(
+            ExtractionCacheEntry.key.in_(overflow_keys)
+        ).delete(synchronize_session=False)
+
+        session.commit()
+        return expired + overflow
+    finally:
+        session.close()
@@ -0,0 +1,132 @@
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from threading import Lock
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .database import FoodItemDB
+from .models import Ingredient
+from .snapshots import current_crawl_id_query
+
+# Offers scoring below this are not considered a match
+MIN_MATCH_SCORE = 0.45
+# Descriptions are translated to English by the extraction prompt while names often stay German,
+# so a match on the description counts almost as much as one on the name
+DESCRIPTION_WEIGHT = 0.9
+
+OFFER_COLUMNS = [
+    FoodItemDB.id, FoodItemDB.source_url, FoodItemDB.food_name, FoodItemDB.food_item_description,
+    FoodItemDB.price, FoodItemDB.quantity, FoodItemDB.price_cents, FoodItemDB.quantity_value,
+    FoodItemDB.quantity_unit, FoodItemDB.unit_price_cents,
+]
+
+
+def normalize_text(text: str | None) -> str:
+    """Lowercase, fold umlauts and accents and keep only letters and digits."""
+    text = (text or "").casefold().replace("ß", "ss")
+    text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", " ", text).strip()
+
+
+def trigrams(text: str | None) -> frozenset[str]:
+    """Padded character trigrams of every word, so short words and word starts still match."""
+    grams = set()
+    for word in normalize_text(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class OfferIndex:
+    """Trigram inverted index over the offers of one crawl snapshot.
+
+    Names and descriptions have separate posting lists. A query counts its shared
+    trigrams per offer by walking the posting lists of its own trigrams, so offers
+    sharing nothing with the query are never touched.
+    """
+
+    def __init__(self, crawl_id: int | None, offers: list[dict]):
+        self.crawl_id = crawl_id
+        self.offers = offers
+        self._name_sizes = []
+        self._name_postings: dict[str, list[int]] = defaultdict(list)
+        self._description_postings: dict[str, list[int]] = defaultdict(list)
+        for position, offer in enumerate(offers):
+            name_grams = trigrams(offer["food_name"])
+            self._name_sizes.append(len(name_grams))
+            for gram in name_grams:
+                self._name_postings[gram].append(position)
+            for gram in trigrams(offer["food_item_description"]):
+                self._description_postings[gram].append(position)
+
+    def search(self, query: str, limit: int = 3) -> list[dict]:
+        """Return up to limit best offers for query, cheapest per unit first among equal scores."""
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        name_hits = Counter()
+        description_hits = Counter()
+        for gram in query_grams:
+            name_hits.update(self._name_postings.get(gram, ()))
+            description_hits.update(self._description_postings.get(gram, ()))
+
+        # Dice coefficient on the name, share of query trigrams found in the description
+        scores = {
+            position: 2 * hits / (len(query_grams) + self._name_sizes[position])
+            for position, hits in name_hits.items()
+        }
+        # Offers below this many shared trigrams cannot reach the minimum score through their description
+        required = MIN_MATCH_SCORE * len(query_grams) / DESCRIPTION_WEIGHT
+        for position, hits in description_hits.items():
+            if hits >= required:
+                score = DESCRIPTION_WEIGHT * hits / len(query_grams)
+                if score > scores.get(position, 0):
+                    scores[position] = score
+
+        def rank(position):
+            unit_price = self.offers[position]["unit_price_cents"]
+            return -round(scores[position], 2), unit_price if unit_price is not None else math.inf
+
+        matches = [position for position, score in scores.items() if score >= MIN_MATCH_SCORE]
+        return [
+            {**self.offers[position], "score": round(scores[position], 3)}
+            for position in heapq.nsmallest(limit, matches, key=rank)
+        ]
+
+
+_index: OfferIndex | None = None
+_index_lock = Lock()
+
+
+def get_offer_index(session: Session) -> OfferIndex:
+    """Return the index of the published snapshot, rebuilding it when a new snapshot was published."""
+    global _index
+    crawl_id = session.scalar(current_crawl_id_query())
+    if _index is not None and _index.crawl_id == crawl_id:
+        return _index
+    with _index_lock:
+        if _index is None or _index.crawl_id != crawl_id:
+            rows = session.execute(select(*OFFER_COLUMNS).where(FoodItemDB.crawl_id == crawl_id)).mappings()
+            _index = OfferIndex(crawl_id, [dict(row) for row in rows])
+    return _index
+
+
+def match_ingredients(index: OfferIndex, ingredients: list[Ingredient], limit: int = 3) -> list[dict]:
+    """Best offers per ingredient, with the number of packs and cost needed to cover the quantity."""
+    matches = []
+    for ingredient in ingredients:
+        needed = ingredient.base_quantity()
+        offers = index.search(ingredient.name, limit)
+        for offer in offers:
+            packs = None
+            if needed and offer["quantity_unit"] == needed[1] and offer["quantity_value"]:
+                packs = math.ceil(needed[0] / offer["quantity_value"])
+            offer["packs"] = packs
+            offer["cost_cents"] = packs * offer["price_cents"] if packs and offer["price_cents"] is not None else None
+        matches.append({"ingredient": ingredient.model_dump(), "offers": offers})
+    return matches
@@ -0,0 +1,72 @@
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest, multiprocess
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Upper bounds in seconds, from sub-millisecond cache hits up to slow Gemini video calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# With this directory set, prometheus_client keeps the values of every worker process in
+# files there and each worker serves the aggregate of all of them
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+def render_metrics() -> bytes:
+    """Metrics in the Prometheus text format, aggregated over all workers in multiprocess mode."""
+    if not MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def mark_process_dead() -> None:
+    """Drop this process's live gauges from the aggregate; call when a worker exits."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request until its response body was sent",
+    ("method", "route", "status"),
+    buckets=DEFAULT_BUCKETS,
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware observing request latency per route template.
+
+    Requests that match no route are recorded as "unmatched", so probing random
+    paths cannot create unbounded label values.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the shared scope
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            ).observe(time.perf_counter() - started)
@@ -2,6 +2,8 @@ from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional, List
 
+from .normalize import normalize_quantity
+
 
 class VideoAnalysisBase(BaseModel):
     """Base model for video analysis data"""
@@ -43,6 +45,10 @@ class Ingredient(BaseModel):
     quantity: float
     unit: str
 
+    def base_quantity(self) -> Optional[tuple[float, str]]:
+        """Quantity in grams, milliliters or pieces, or None for units that cannot be converted"""
+        return normalize_quantity(self.quantity, self.unit)
+
 
 class Recipe(BaseModel):
     name: str
@@ -0,0 +1,123 @@
+import re
+
+# Canonical base units
+GRAMS = "g"
+MILLILITERS = "ml"
+PIECES = "piece"
+
+# Unit spellings produced by the extraction prompt, German abbreviations and common recipe units,
+# mapped to (base unit, factor to convert into it)
+UNIT_FACTORS = {
+    "mg": (GRAMS, 0.001), "milligram": (GRAMS, 0.001), "milligrams": (GRAMS, 0.001),
+    "g": (GRAMS, 1), "gr": (GRAMS, 1), "gram": (GRAMS, 1), "grams": (GRAMS, 1), "gramm": (GRAMS, 1),
+    "kg": (GRAMS, 1000), "kilo": (GRAMS, 1000), "kilogram": (GRAMS, 1000), "kilograms": (GRAMS, 1000),
+    "oz": (GRAMS, 28.3495), "ounce": (GRAMS, 28.3495), "ounces": (GRAMS, 28.3495),
+    "lb": (GRAMS, 453.592), "lbs": (GRAMS, 453.592), "pound": (GRAMS, 453.592), "pounds": (GRAMS, 453.592),
+    "ml": (MILLILITERS, 1), "milliliter": (MILLILITERS, 1), "milliliters": (MILLILITERS, 1),
+    "millilitre": (MILLILITERS, 1), "millilitres": (MILLILITERS, 1),
+    "cl": (MILLILITERS, 10), "centiliter": (MILLILITERS, 10), "centiliters": (MILLILITERS, 10),
+    "l": (MILLILITERS, 1000), "liter": (MILLILITERS, 1000), "liters": (MILLILITERS, 1000),
+    "litre": (MILLILITERS, 1000), "litres": (MILLILITERS, 1000),
+    "tsp": (MILLILITERS, 5), "teaspoon": (MILLILITERS, 5), "teaspoons": (MILLILITERS, 5),
+    "tbsp": (MILLILITERS, 15), "tablespoon": (MILLILITERS, 15), "tablespoons": (MILLILITERS, 15),
+    "cup": (MILLILITERS, 240), "cups": (MILLILITERS, 240),
+    "piece": (PIECES, 1), "pieces": (PIECES, 1), "pc": (PIECES, 1), "pcs": (PIECES, 1),
+    "stück": (PIECES, 1), "stk": (PIECES, 1), "pack": (PIECES, 1), "packs": (PIECES, 1),
+    "bottle": (PIECES, 1), "bottles": (PIECES, 1), "can": (PIECES, 1), "cans": (PIECES, 1),
+    "unit": (PIECES, 1), "units": (PIECES, 1), "whole": (PIECES, 1),
+}
+
+# Unit prices are per kilogram, per liter or per piece
+UNIT_PRICE_BASE = {GRAMS: 1000, MILLILITERS: 1000, PIECES: 1}
+
+_NUMBER = r"\d+(?:[.,]\d+)*"
+# Thousands-grouped prices ("1.234,50") are tried first; plain ones ("1234.99", "1299") must not
+# stop inside a longer number, so both forms end at a non-digit
+_PRICE_RE = re.compile(r"\d{1,3}(?:[.,]\d{3})+(?:[.,]\d{1,2})?(?!\d)|\d+(?:[.,]\d{1,2})?(?!\d)")
+# "500 grams", "0,75 l", "6 x 1.5 liters", "2x250g"
+_QUANTITY_RE = re.compile(
+    rf"(?:(?P<count>{_NUMBER})\s*[x×]\s*)?(?P<value>{_NUMBER})\s*(?P<unit>[^\W\d_]+)",
+    re.IGNORECASE,
+)
+
+
+def parse_number(text: str) -> float | None:
+    """Parse a number written with either '.' or ',' as decimal separator."""
+    text = text.strip()
+    if not text:
+        return None
+    separators = [i for i, char in enumerate(text) if char in ".,"]
+    if separators:
+        last = separators[-1]
+        digits_after = len(text) - last - 1
+        # A single separator followed by exactly three digits is a thousands separator ("1.000")
+        if len(separators) == 1 and digits_after == 3:
+            text = text.replace(text[last], "")
+        else:
+            text = re.sub(r"[.,]", "", text[:last]) + "." + text[last + 1:]
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def parse_price_cents(price: str | None) -> int | None:
+    """Parse a price such as '2.99 EUR', '2,99 €' or '1.234,50 EUR' into cents."""
+    if not price:
+        return None
+    match = _PRICE_RE.search(price)
+    if not match:
+        return None
+    number = match.group(0)
+    # Prices always carry a decimal part when a separator is followed by one or two digits
+    if re.search(r"[.,]\d{1,2}$", number):
+        euros, cents = re.split(r"[.,](?=\d{1,2}$)", number)
+        cents = cents.ljust(2, "0")
+        return int(re.sub(r"[.,]", "", euros)) * 100 + int(cents)
+    value = parse_number(number)
+    return round(value * 100) if value is not None else None
+
+
+def normalize_quantity(value: float | None, unit: str | None) -> tuple[float, str] | None:
+    """Convert a value in any known unit into (value, base unit)."""
+    if value is None or not unit:
+        return None
+    factor = UNIT_FACTORS.get(unit.strip().lower().rstrip("."))
+    if factor is None:
+        return None
+    base_unit, multiplier = factor
+    return value * multiplier, base_unit
+
+
+def parse_quantity(quantity: str | None) -> tuple[float, str] | None:
+    """Parse a quantity such as '500 grams', '0,75 l' or '6 x 1.5 liters' into (value, base unit)."""
+    if not quantity:
+        return None
+    for match in _QUANTITY_RE.finditer(quantity):
+        value = parse_number(match.group("value"))
+        normalized = normalize_quantity(value, match.group("unit"))
+        if normalized is None:
+            continue
+        count = parse_number(match.group("count")) if match.group("count") else 1
+        return normalized[0] * (count or 1), normalized[1]
+    return None
+
+
+def unit_price_cents(price_cents: int | None, quantity: tuple[float, str] | None) -> int | None:
+    """Price per kilogram, liter or piece in cents."""
+    if price_cents is None or quantity is None or quantity[0] <= 0:
+        return None
+    value, unit = quantity
+    return round(price_cents * UNIT_PRICE_BASE[unit] / value)
+
+
+def normalized_columns(price: str | None, quantity: str | None) -> dict:
+    """Typed price and quantity columns for a food item row."""
+    price_cents = parse_price_cents(price)
+    parsed_quantity = parse_quantity(quantity)
+    return {
+        "price_cents": price_cents,
+        "quantity_value": parsed_quantity[0] if parsed_quantity else None,
+        "quantity_unit": parsed_quantity[1] if parsed_quantity else None,
+        "unit_price_cents": unit_price_cents(price_cents, parsed_quantity),
+    }
@@ -0,0 +1,209 @@
+import copy
+import typing
+from typing import Any
+
+from pydantic import BaseModel, TypeAdapter
+
+JSON_PATCH_OPS = {"add", "remove", "replace", "move", "copy", "test"}
+
+
+class PatchError(ValueError):
+    """A patch document is malformed or cannot be applied to the target."""
+
+
+class PatchTestFailed(PatchError):
+    """A JSON Patch "test" operation did not match the current document."""
+
+
+def parse_pointer(pointer: str) -> list[str]:
+    """Split an RFC 6901 JSON pointer into unescaped reference tokens."""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise PatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _list_index(container: list, token: str, allow_end: bool) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise PatchError(f"Invalid list index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PatchError(f"List index out of range: {token}")
+    return index
+
+
+def _resolve(document: Any, tokens: list[str]) -> Any:
+    for token in tokens:
+        if isinstance(document, dict):
+            if token not in document:
+                raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+            document = document[token]
+        elif isinstance(document, list):
+            document = document[_list_index(document, token, allow_end=False)]
+        else:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+    return document
+
+
+def _add(document: Any, tokens: list[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent, token = _resolve(document, tokens[:-1]), tokens[-1]
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(_list_index(parent, token, allow_end=True), value)
+    else:
+        raise PatchError(f"Cannot add to a scalar at /{'/'.join(tokens)}")
+    return document
+
+
+def _remove(document: Any, tokens: list[str]) -> tuple[Any, Any]:
+    if not tokens:
+        raise PatchError("Cannot remove the whole document")
+    parent, token = _resolve(document, tokens[:-1]), tokens[-1]
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+        return document, parent.pop(token)
+    if isinstance(parent, list):
+        return document, parent.pop(_list_index(parent, token, allow_end=False))
+    raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+
+
+def _replace(document: Any, tokens: list[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent, token = _resolve(document, tokens[:-1]), tokens[-1]
+    if isinstance(parent, dict) and token in parent:
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent[_list_index(parent, token, allow_end=False)] = value
+    else:
+        raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+    return document
+
+
+def apply_json_patch(document: Any, operations: list[dict]) -> tuple[Any, list[list[str]]]:
+    """Apply RFC 6902 operations to a copy of document.
+
+    Returns the patched document and the paths it changed, as token lists.
+    """
+    document = copy.deepcopy(document)
+    changed = []
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get("op") not in JSON_PATCH_OPS or "path" not in operation:
+            raise PatchError(f"Invalid patch operation: {operation!r}")
+        op, path = operation["op"], parse_pointer(operation["path"])
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise PatchError(f"Operation {op} requires a value")
+        if op in ("move", "copy") and "from" not in operation:
+            raise PatchError(f"Operation {op} requires from")
+
+        if op == "test":
+            if _resolve(document, path) != operation["value"]:
+                raise PatchTestFailed(f"Test failed at {operation['path']}")
+            continue
+        if op == "add":
+            document = _add(document, path, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            document, _ = _remove(document, path)
+        elif op == "replace":
+            document = _replace(document, path, copy.deepcopy(operation["value"]))
+        elif op == "move":
+            source = parse_pointer(operation["from"])
+            if path[:len(source)] == source and path != source:
+                raise PatchError("Cannot move a value into one of its children")
+            document, value = _remove(document, source)
+            document = _add(document, path, value)
+            changed.append(source)
+        elif op == "copy":
+            value = copy.deepcopy(_resolve(document, parse_pointer(operation["from"])))
+            document = _add(document, path, value)
+        changed.append(path)
+    return document, changed
+
+
+def apply_merge_patch(document: Any, patch: Any) -> tuple[Any, list[list[str]]]:
+    """Apply an RFC 7396 merge patch to a copy of document.
+
+    Returns the patched document and the paths it changed, as token lists.
+    """
+    changed = []
+
+    def merge(target: Any, patch: Any, tokens: list[str]) -> Any:
+        if not isinstance(patch, dict):
+            changed.append(tokens)
+            return copy.deepcopy(patch)
+        if not isinstance(target, dict):
+            # A list, scalar or missing member becomes an object, which the model must accept
+            changed.append(tokens)
+            target = {}
+        else:
+            target = dict(target)
+        for key, value in patch.items():
+            if value is None:
+                if key in target:
+                    del target[key]
+                    changed.append([*tokens, key])
+            else:
+                target[key] = merge(target.get(key), value, [*tokens, key])
+        return target
+
+    return merge(document, patch, []), changed
+
+
+def validate_changed(model: type[BaseModel], document: Any, paths: list[list[str]]) -> None:
+    """Validate only the sub-models enclosing the changed paths.
+
+    For every path the deepest enclosing object or list that still exists in the
+    patched document is validated against its type in model, so editing one
+    day's meal validates that DayMeal only. Raises pydantic.ValidationError.
+    """
+    validated = set()
+    for tokens in paths:
+        value, annotation = _enclosing(model, document, tokens)
+        key = (id(value), str(annotation))
+        if key not in validated:
+            validated.add(key)
+            TypeAdapter(annotation).validate_python(value)
+
+
+def _enclosing(model: type[BaseModel], document: Any, tokens: list[str]) -> tuple[Any, Any]:
+    # Walk down as far as both the document and the model's type annotations go
+    trail = [(document, model)]
+    value, annotation = document, model
+    for token in tokens:
+        annotation = _unwrap_optional(annotation)
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel) and isinstance(value, dict):
+            field = annotation.model_fields.get(token)
+            if field is None:
+                raise PatchError(f"Unknown field {token!r} in {annotation.__name__}")
+            if token not in value:
+                break
+            value, annotation = value[token], field.annotation
+        elif typing.get_origin(annotation) is list and isinstance(value, list):
+            if not token.isdigit() or int(token) >= len(value):
+                break
+            value, annotation = value[int(token)], typing.get_args(annotation)[0]
+        else:
+            break
+        trail.append((value, annotation))
+
+    for value, annotation in reversed(trail):
+        annotation = _unwrap_optional(annotation)
+        if typing.get_origin(annotation) is list or (
+                isinstance(annotation, type) and issubclass(annotation, BaseModel)
+        ):
+            return value, annotation
+    return document, model
+
+
+def _unwrap_optional(annotation: Any) -> Any:
+    args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+    if typing.get_origin(annotation) is typing.Union and len(args) == 1:
+        return args[0]
+    return annotation
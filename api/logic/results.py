@@ -0,0 +1,78 @@
+import json
+import os
+from datetime import datetime
+from typing import Iterator
+
+from sqlalchemy import Select, select
+
+from .database import FoodItemDB, get_session
+from .snapshots import current_crawl_id_query
+
+RESULTS_PAGE_SIZE = int(os.getenv("RESULTS_PAGE_SIZE", "500"))
+RESULTS_MAX_PAGE_SIZE = int(os.getenv("RESULTS_MAX_PAGE_SIZE", "5000"))
+# Rows fetched per round trip from the server-side cursor when streaming
+RESULTS_STREAM_BATCH = int(os.getenv("RESULTS_STREAM_BATCH", "1000"))
+
+RESULT_FIELDS = {column.name: column for column in FoodItemDB.__table__.columns}
+
+
+def parse_fields(fields: str | None) -> list[str]:
+    """Validate a comma-separated field projection; id is always included as the cursor."""
+    if not fields:
+        return list(RESULT_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in RESULT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return ["id", *[name for name in dict.fromkeys(names) if name != "id"]]
+
+
+def results_query(
+        fields: list[str],
+        after_id: int | None = None,
+        source_url: str | None = None,
+        q: str | None = None,
+        min_price_cents: int | None = None,
+        max_price_cents: int | None = None,
+) -> Select:
+    """Items of the published snapshot in id order, starting after the keyset cursor after_id."""
+    query = select(*[RESULT_FIELDS[name] for name in fields]).where(FoodItemDB.crawl_id == current_crawl_id_query())
+    if after_id is not None:
+        query = query.where(FoodItemDB.id > after_id)
+    if source_url:
+        query = query.where(FoodItemDB.source_url == source_url)
+    if q:
+        query = query.where(FoodItemDB.food_name.ilike(f"%{q}%"))
+    if min_price_cents is not None:
+        query = query.where(FoodItemDB.price_cents >= min_price_cents)
+    if max_price_cents is not None:
+        query = query.where(FoodItemDB.price_cents <= max_price_cents)
+    return query.order_by(FoodItemDB.id)
+
+
+def fetch_page(query: Select, limit: int) -> dict:
+    """One page of results and the cursor for the next page, or None after the last one."""
+    session = get_session()
+    try:
+        items = [dict(row) for row in session.execute(query.limit(limit)).mappings()]
+    finally:
+        session.close()
+    next_after_id = items[-1]["id"] if len(items) == limit else None
+    return {"items": items, "next_after_id": next_after_id}
+
+
+def stream_ndjson(query: Select) -> Iterator[bytes]:
+    """Serialize rows as newline-delimited JSON straight from a server-side cursor."""
+    session = get_session()
+    try:
+        result = session.execute(query.execution_options(yield_per=RESULTS_STREAM_BATCH)).mappings()
+        for rows in result.partitions():
+            yield "".join(json.dumps(dict(row), default=_json_default) + "\n" for row in rows).encode()
+    finally:
+        session.close()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
@@ -0,0 +1,215 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .database import CrawlPointer, CrawlRun, FoodItemDB, PageValidator, get_session
+
+# Number of completed snapshots kept for price history; older ones are garbage-collected
+CRAWL_RETENTION = int(os.getenv("CRAWL_RETENTION", "30"))
+# A running crawl whose worker has not sent a heartbeat for this long is considered dead
+CRAWL_HEARTBEAT_TIMEOUT = timedelta(seconds=int(os.getenv("CRAWL_HEARTBEAT_TIMEOUT_SECONDS", "120")))
+
+REQUESTED = "requested"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Columns copied verbatim when an unchanged page is carried into a new snapshot
+CARRIED_COLUMNS = [
+    "source_url", "food_name", "food_item_description", "price", "quantity", "scraped_at",
+    "price_cents", "quantity_value", "quantity_unit", "unit_price_cents",
+]
+
+
+def current_crawl_id_query():
+    """Scalar subquery for the snapshot readers should see."""
+    return select(CrawlPointer.current_crawl_id).where(CrawlPointer.id == 1).scalar_subquery()
+
+
+def request_crawl_run() -> int | None:
+    """Queue a crawl for the crawler workers and return its id.
+
+    Returns None when a crawl is already requested or running; a partial unique
+    index on crawl_runs allows only one such run across all processes.
+    """
+    session = get_session()
+    try:
+        run = CrawlRun(status=REQUESTED, requested_at=datetime.utcnow())
+        session.add(run)
+        session.commit()
+        return run.id
+    except IntegrityError:
+        session.rollback()
+        return None
+    finally:
+        session.close()
+
+
+def claim_crawl_run(worker: str) -> int | None:
+    """Atomically take the oldest requested crawl for this worker and return its id, if any."""
+    session = get_session()
+    try:
+        requested = (
+            select(CrawlRun.id).where(CrawlRun.status == REQUESTED)
+            .order_by(CrawlRun.id).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+        )
+        now = datetime.utcnow()
+        # Items are written into the new snapshot; readers see the current one until it is published
+        crawl_id = session.scalar(
+            update(CrawlRun).where(CrawlRun.id == requested)
+            .values(
+                status=RUNNING, worker=worker, started_at=now, heartbeat_at=now,
+                base_crawl_id=current_crawl_id_query(),
+            )
+            .returning(CrawlRun.id)
+        )
+        session.commit()
+        return crawl_id
+    finally:
+        session.close()
+
+
+def heartbeat_crawl_run(crawl_id: int) -> None:
+    session = get_session()
+    try:
+        session.execute(
+            update(CrawlRun).where(CrawlRun.id == crawl_id, CrawlRun.status == RUNNING)
+            .values(heartbeat_at=datetime.utcnow())
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def reap_stale_crawl_runs(timeout: timedelta = CRAWL_HEARTBEAT_TIMEOUT) -> list[int]:
+    """Fail crawls nobody works on and return their ids.
+
+    These are running crawls whose worker stopped sending heartbeats and requested
+    crawls no worker claimed within timeout, e.g. because none is deployed; either
+    would otherwise keep every new crawl from being requested.
+    """
+    cutoff = datetime.utcnow() - timeout
+    session = get_session()
+    try:
+        # Requested runs have no items or validators yet, so failing them is a status change
+        unclaimed = list(session.scalars(
+            update(CrawlRun).where(CrawlRun.status == REQUESTED, CrawlRun.requested_at < cutoff)
+            .values(status=FAILED, finished_at=datetime.utcnow())
+            .returning(CrawlRun.id)
+        ))
+        session.commit()
+        stale = list(session.scalars(
+            select(CrawlRun.id).where(CrawlRun.status == RUNNING, CrawlRun.heartbeat_at < cutoff)
+        ))
+    finally:
+        session.close()
+    for crawl_id in stale:
+        fail_crawl_run(crawl_id)
+    return unclaimed + stale
+
+
+def active_crawl_run() -> CrawlRun | None:
+    """The crawl that is currently requested or running, if any."""
+    session = get_session()
+    try:
+        return session.scalar(select(CrawlRun).where(CrawlRun.status.in_((REQUESTED, RUNNING))))
+    finally:
+        session.close()
+
+
+def last_completed_crawl_run() -> CrawlRun | None:
+    session = get_session()
+    try:
+        return session.scalar(
+            select(CrawlRun).where(CrawlRun.status == COMPLETED).order_by(CrawlRun.id.desc()).limit(1)
+        )
+    finally:
+        session.close()
+
+
+def carry_over_items(session: Session, crawl_id: int, source_urls: set[str]) -> None:
+    """Copy the base snapshot's items of the given pages into snapshot crawl_id."""
+    base_crawl_id = session.scalar(select(CrawlRun.base_crawl_id).where(CrawlRun.id == crawl_id))
+    if base_crawl_id is None or not source_urls:
+        return
+    table = FoodItemDB.__table__
+    rows = select(literal(crawl_id), *[table.c[column] for column in CARRIED_COLUMNS]).where(
+        table.c.crawl_id == base_crawl_id,
+        table.c.source_url.in_(source_urls),
+    )
+    session.execute(insert(table).from_select(["crawl_id", *CARRIED_COLUMNS], rows))
+
+
+def carry_over_pages(crawl_id: int, page_urls: set[str]) -> None:
+    """Carry over the items of start URLs this crawl did not store, e.g. after a fetch or extraction error."""
+    session = get_session()
+    try:
+        validators = session.query(PageValidator).filter(PageValidator.url.in_(page_urls)).all()
+        carry_over_items(session, crawl_id, {v.source_url for v in validators if v.source_url})
+        session.commit()
+    finally:
+        session.close()
+
+
+def publish_crawl_run(crawl_id: int, stats: dict | None = None) -> None:
+    """Mark a snapshot completed and point readers at it in a single transaction."""
+    session = get_session()
+    try:
+        run = session.get(CrawlRun, crawl_id)
+        run.status = COMPLETED
+        run.finished_at = datetime.utcnow()
+        run.stats = stats
+        run.item_count = session.query(FoodItemDB).filter(FoodItemDB.crawl_id == crawl_id).count()
+
+        pointer = session.get(CrawlPointer, 1, with_for_update=True) or CrawlPointer(id=1)
+        pointer.current_crawl_id = crawl_id
+        session.add(pointer)
+        session.commit()
+    finally:
+        session.close()
+
+
+def fail_crawl_run(crawl_id: int) -> None:
+    """Discard an unfinished snapshot and make its pages re-extract on the next crawl."""
+    session = get_session()
+    try:
+        run = session.get(CrawlRun, crawl_id)
+        if run is None or run.status != RUNNING:
+            return
+        run.status = FAILED
+        run.finished_at = datetime.utcnow()
+        session.query(FoodItemDB).filter(FoodItemDB.crawl_id == crawl_id).delete(synchronize_session=False)
+        # Validators written by this crawl describe content whose items were just discarded
+        session.query(PageValidator).filter(PageValidator.crawl_id == crawl_id).update(
+            {"etag": None, "last_modified": None, "content_hash": None}, synchronize_session=False
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def collect_garbage(retention: int = CRAWL_RETENTION) -> int:
+    """Delete failed snapshots and completed ones beyond the newest `retention`.
+
+    The current snapshot is never deleted. Returns the number of deleted runs.
+    """
+    session = get_session()
+    try:
+        current = session.scalar(current_crawl_id_query())
+        kept = select(CrawlRun.id).where(CrawlRun.status == COMPLETED).order_by(CrawlRun.id.desc()).limit(retention)
+        doomed = [
+            run_id for run_id in session.scalars(
+                select(CrawlRun.id).where(CrawlRun.status.notin_((REQUESTED, RUNNING)), CrawlRun.id.notin_(kept))
+            )
+            if run_id != current
+        ]
+        if doomed:
+            session.query(FoodItemDB).filter(FoodItemDB.crawl_id.in_(doomed)).delete(synchronize_session=False)
+            session.query(CrawlRun).filter(CrawlRun.id.in_(doomed)).delete(synchronize_session=False)
+        session.commit()
+        return len(doomed)
+    finally:
+        session.close()
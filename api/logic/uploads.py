@@ -0,0 +1,69 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from prometheus_client import Counter, Histogram
+
+from .metrics import DEFAULT_BUCKETS
+
+# Read the upload in 1 MiB chunks so memory stays flat regardless of video size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+UPLOAD_SPOOL_SECONDS = Histogram(
+    "upload_spool_seconds",
+    "Time per upload spent receiving, hashing and writing it to the spool file",
+    ("stage",),
+    buckets=DEFAULT_BUCKETS,
+)
+UPLOAD_BYTES = Counter("upload_bytes_total", "Bytes of uploaded videos spooled to disk")
+
+
+async def spool_upload(upload: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE) -> tuple[str, str, int]:
+    """Stream an upload to a temporary file while hashing it in a single pass.
+
+    Returns a tuple of (temp file path, SHA-256 hex digest, size in bytes).
+    The caller is responsible for removing the temporary file.
+    """
+    suffix = os.path.splitext(upload.filename or "")[1]
+    sha256_hash = hashlib.sha256()
+    size = 0
+
+    stage_seconds = {"read": 0.0, "hash": 0.0, "write": 0.0}
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+
+    def hash_and_write(chunk: bytes) -> None:
+        started = time.perf_counter()
+        sha256_hash.update(chunk)
+        hashed_at = time.perf_counter()
+        temp_file.write(chunk)
+        stage_seconds["hash"] += hashed_at - started
+        stage_seconds["write"] += time.perf_counter() - hashed_at
+
+    try:
+        with temp_file:
+            while True:
+                started = time.perf_counter()
+                chunk = await upload.read(chunk_size)
+                stage_seconds["read"] += time.perf_counter() - started
+                if not chunk:
+                    break
+                # Hashing and writing a chunk takes milliseconds; keep it off the event loop
+                await run_in_threadpool(hash_and_write, chunk)
+                size += len(chunk)
+    except Exception:
+        os.unlink(temp_file.name)
+        raise
+
+    for stage, seconds in stage_seconds.items():
+        UPLOAD_SPOOL_SECONDS.labels(stage=stage).observe(seconds)
+    UPLOAD_BYTES.inc(size)
+    return temp_file.name, sha256_hash.hexdigest(), size
+
+
+def remove_spooled_file(path: str | None) -> None:
+    """Delete a spooled upload if it still exists."""
+    if path and os.path.exists(path):
+        os.unlink(path)
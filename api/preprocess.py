@@ -0,0 +1,157 @@
+import os
+import re
+from threading import Lock
+
+import lxml.html
+from lxml import etree
+
+# Chunk size and overlap for extraction prompts, in characters (~4 characters per token)
+EXTRACTION_CHUNK_CHARS = int(os.getenv("EXTRACTION_CHUNK_CHARS", "24000"))
+EXTRACTION_CHUNK_OVERLAP_CHARS = int(os.getenv("EXTRACTION_CHUNK_OVERLAP_CHARS", "1000"))
+
+# Elements that never carry visible product information. Form controls go, but not <form>
+# itself: many shops wrap the whole product listing in one
+BOILERPLATE_TAGS = [
+    "script", "style", "noscript", "template", "svg", "iframe", "canvas",
+    "head", "nav", "header", "footer", "button", "select", "input",
+]
+
+# class/id fragments marking product tiles and offer lists on retailer pages
+PRODUCT_REGION_XPATH = (
+    "//*[re:test(concat(@class, ' ', @id), "
+    "'product|offer|angebot|artikel|tile|price|preis', 'i')]"
+)
+# class/id fragments marking cookie banners and other overlays
+OVERLAY_XPATH = "//*[re:test(concat(@class, ' ', @id), 'cookie|consent|modal|newsletter', 'i')]"
+REGEX_NAMESPACE = {"re": "http://exslt.org/regular-expressions"}
+
+# Elements whose text starts on a new line when the page is rendered
+BLOCK_TAGS = [
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption",
+    "figure", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "li", "main", "ol", "p", "section",
+    "table", "tbody", "td", "th", "thead", "tr", "ul",
+]
+
+# Only trust product regions when they hold a meaningful share of the page text
+MIN_PRODUCT_REGION_CHARS = 500
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate for Gemini prompts."""
+    return len(text) // 4
+
+
+def html_to_text(html: str) -> str:
+    """Strip markup and boilerplate and return the visible product/offer text of a page.
+
+    Falls back to the whole visible body text when no product regions are found.
+    """
+    try:
+        root = lxml.html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return normalize_whitespace(html)
+
+    etree.strip_elements(root, etree.Comment, *BOILERPLATE_TAGS, with_tail=False)
+    for overlay in root.xpath(OVERLAY_XPATH, namespaces=REGEX_NAMESPACE):
+        overlay.drop_tree()
+    # Keep block boundaries apart while inline markup such as <b>2</b>,99 stays on one line
+    for block in root.iter(*BLOCK_TAGS):
+        block.tail = "\n" + (block.tail or "")
+
+    regions = _outermost(root.xpath(PRODUCT_REGION_XPATH, namespaces=REGEX_NAMESPACE))
+    region_text = "\n".join(region.text_content() for region in regions)
+    if len(region_text) >= MIN_PRODUCT_REGION_CHARS:
+        return normalize_whitespace(region_text)
+    return normalize_whitespace(root.text_content())
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse runs of spaces and drop empty lines."""
+    lines = (re.sub(r"[ \t\r\f\v\u00a0]+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def chunk_text(
+        text: str,
+        max_chars: int = EXTRACTION_CHUNK_CHARS,
+        overlap_chars: int = EXTRACTION_CHUNK_OVERLAP_CHARS,
+) -> list[str]:
+    """Split text at line boundaries into chunks of at most max_chars.
+
+    Consecutive chunks share about overlap_chars of trailing lines, so an offer
+    cut at a boundary appears whole in at least one chunk. Lines longer than
+    max_chars are split into windows that overlap by overlap_chars.
+    """
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    chunks = []
+    current: list[str] = []
+    current_len = 0
+    for line in _split_long_lines(text, max_chars, overlap_chars):
+        if current and current_len + len(line) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            # Carry the tail of this chunk over as the start of the next one
+            carried, carried_len = [], 0
+            for previous in reversed(current):
+                if carried_len + len(previous) + 1 > overlap_chars:
+                    break
+                carried.insert(0, previous)
+                carried_len += len(previous) + 1
+            # Drop carried lines the next one would not fit next to
+            while carried and carried_len + len(line) + 1 > max_chars:
+                carried_len -= len(carried.pop(0)) + 1
+            current, current_len = carried, carried_len
+        current.append(line)
+        current_len += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _split_long_lines(text: str, max_chars: int, overlap_chars: int):
+    # Pages without block tags, and the fallback for unparseable HTML, are one long line
+    step = max(max_chars - overlap_chars, 1)
+    for line in text.splitlines():
+        if len(line) <= max_chars:
+            yield line
+            continue
+        for start in range(0, len(line) - overlap_chars, step):
+            yield line[start:start + max_chars]
+
+
+class PreprocessStats:
+    """Token estimates before and after preprocessing, summed over a crawl."""
+
+    def __init__(self):
+        self.pages = 0
+        self.chunks = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = Lock()
+
+    def record(self, input_tokens: int, output_tokens: int, chunks: int) -> None:
+        with self._lock:
+            self.pages += 1
+            self.chunks += chunks
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "pages": self.pages,
+                "chunks": self.chunks,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "reduction": 1 - self.output_tokens / self.input_tokens if self.input_tokens else 0.0,
+            }
+
+
+def _outermost(elements: list) -> list:
+    """Drop elements nested inside other matched elements to avoid duplicate text."""
+    selected = set(elements)
+    return [
+        element for element in elements
+        if not any(ancestor in selected for ancestor in element.iterancestors())
+    ]
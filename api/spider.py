@@ -0,0 +1,476 @@
+# Import standard libraries
+import hashlib
+import json
+import logging
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import Lock
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+# Import third-party modules
+import scrapy
+from prometheus_client import Counter as MetricCounter, Histogram
+from pydantic import BaseModel
+from scrapy.utils.project import get_project_settings
+from twisted.internet import reactor, threads
+from twisted.internet.defer import DeferredSemaphore
+
+# Import application-specific modules
+from .extraction import ExtractionStage, StageStats
+from .llm import get_gateway
+from .logic.bulk import BulkWriter
+from .logic.cache import CacheStats
+from .logic.database import FoodItemDB, PageValidator, get_session
+from .logic.extraction_cache import cache_key, evict_entries, get_cached_items, store_items
+from .logic.metrics import DEFAULT_BUCKETS
+from .logic.normalize import normalized_columns
+from .logic.snapshots import carry_over_items, carry_over_pages, collect_garbage, publish_crawl_run
+from .preprocess import PreprocessStats, chunk_text, estimate_tokens, html_to_text
+
+# Load environment variables
+load_dotenv()
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", None)
+
+logger = logging.getLogger("meal_planner_api.spider")
+
+# List of target websites
+WEBSITES = [
+    "https://www.aldi-nord.de/",
+    "https://www.aldi-sued.de/",
+    "https://www.lidl.de/",
+    "https://www.lidl.de/c/billiger-montag/a10006065?channel=store&tabCode=Current_Sales_Week",
+    "https://netto.de/",
+    "https://www.edeka.de/eh/angebote.jsp",
+    "https://www.rewe.de/",
+    "https://www.penny.de/",
+    "https://www.real.de/",
+    "https://www.kaufland.de/",
+    "https://www.metro.de/",
+    "https://www.otto.de/",
+]
+
+
+# Per-host politeness. Hosts without an entry in CRAWLER_DOMAIN_POLICIES, a JSON object like
+# {"www.lidl.de": {"concurrency": 1, "delay": 5}}, use the default policy.
+CRAWLER_CONCURRENT_REQUESTS = int(os.getenv("CRAWLER_CONCURRENT_REQUESTS", "16"))
+DEFAULT_DOMAIN_POLICY = {
+    "concurrency": int(os.getenv("CRAWLER_DOMAIN_CONCURRENCY", "1")),
+    "delay": float(os.getenv("CRAWLER_DOMAIN_DELAY", "2")),
+}
+DOMAIN_POLICIES = json.loads(os.getenv("CRAWLER_DOMAIN_POLICIES", "{}"))
+
+
+def build_download_slots(urls: list[str]) -> dict:
+    """Build Scrapy DOWNLOAD_SLOTS giving every target host its own concurrency and delay."""
+    slots = {}
+    for url in urls:
+        host = urlparse(url).hostname
+        policy = {**DEFAULT_DOMAIN_POLICY, **DOMAIN_POLICIES.get(host, {})}
+        slots[host] = {"concurrency": policy["concurrency"], "delay": policy["delay"], "randomize_delay": True}
+    return slots
+
+
+# Configure Scrapy settings
+settings = get_project_settings()
+settings.update({
+    'LOG_LEVEL': 'DEBUG',
+    'ROBOTSTXT_OBEY': False,
+    'COOKIES_ENABLED': True,
+    # Retailers are crawled in parallel; politeness is enforced per host by the download slots
+    'CONCURRENT_REQUESTS': CRAWLER_CONCURRENT_REQUESTS,
+    'CONCURRENT_REQUESTS_PER_DOMAIN': DEFAULT_DOMAIN_POLICY['concurrency'],
+    'DOWNLOAD_DELAY': DEFAULT_DOMAIN_POLICY['delay'],
+    'RANDOMIZE_DOWNLOAD_DELAY': True,
+    'DOWNLOAD_SLOTS': build_download_slots(WEBSITES),
+    # Adapt each host's delay to its observed latency, backing off when it slows down
+    'AUTOTHROTTLE_ENABLED': True,
+    'AUTOTHROTTLE_START_DELAY': DEFAULT_DOMAIN_POLICY['delay'],
+    'AUTOTHROTTLE_MAX_DELAY': 60,
+    'AUTOTHROTTLE_TARGET_CONCURRENCY': 1.0,
+    'USER_AGENT': (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+        '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+    ),
+    'DEFAULT_REQUEST_HEADERS': {
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'de,en-US;q=0.9,en;q=0.8',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Connection': 'keep-alive',
+        'Upgrade-Insecure-Requests': '1'
+    }
+})
+
+# Per-page time in each crawl stage: fetch (download latency), preprocess, extract and insert
+CRAWL_PAGE_STAGE_SECONDS = Histogram(
+    "crawl_page_stage_seconds", "Time per crawled page and stage", ("stage",), buckets=DEFAULT_BUCKETS,
+)
+CRAWL_PAGES = MetricCounter("crawl_pages_total", "Crawled pages by outcome (changed, unchanged, not_modified)", ("outcome",))
+CRAWL_ITEMS = MetricCounter("crawl_items_total", "Food items extracted and written, by store host", ("host",))
+
+# Chunks of one page are extracted concurrently; the Gemini gateway caps the total in flight
+EXTRACTION_CHUNK_WORKERS = int(os.getenv("EXTRACTION_CHUNK_WORKERS", "8"))
+chunk_executor = ThreadPoolExecutor(max_workers=EXTRACTION_CHUNK_WORKERS, thread_name_prefix="extract-chunk")
+
+
+# Define the schema for food items
+class FoodItem(BaseModel):
+    source_url: str
+    food_name: str
+    food_item_description: str
+    price: str
+    quantity: str
+
+
+# Prompt, schema and model for food item extraction; together they version the extraction cache
+EXTRACTION_MODEL = "gemini-2.0-flash"
+EXTRACTION_PROMPT = """
+        Given the following TEXT, identify food items along with their details.
+
+        For each food item, extract the following fields:
+        - **food_name**: The exact name of the product as listed.
+        - **food_item_description**: A detailed description that clearly explains what the product is. Translate the description into English except for brand names and product names.
+        - **price**: The price of the product in EUR.
+        - **quantity**: The quantity or size information if available. Convert any German measurement units or quantity terms in this field to English as specified below.
+
+        Please apply these conversions in the quantity field (and in the description if applicable):
+        - "g" → "grams"
+        - "kg" → "kilograms"
+        - "ml" → "milliliters"
+        - "l" → "liters"
+        - "Stück" → "piece" (or "pieces" when plural)
+        - "Packung" → "pack"
+        - "Flasche" → "bottle"
+        - "Dose" → "can"
+
+        Ensure that:
+        • All units and quantity terms are fully converted to their English equivalents.
+        • The food item description is translated into English without using vague or generic terms (e.g., "Various kinds" or "Verschiedene Sorten"). Instead, be specific—for example, clarify if a product like "GAZI Grill- und Pfannenkäse" is a processed cheese or a type of grillable cheese.
+        • Leave brand names out of the foot item description; instead, provide a descriptive explanation of the product.
+        • The output is a valid JSON array of objects following the schema below.
+
+        Example:
+        [
+            {{
+                "food_name": "Rittersport",
+                "food_item_description": "A milk chocolate bar with a smooth texture and rich flavor",
+                "price": "2.99 EUR",
+                "quantity": "100 grams"
+            }},
+            {{
+                "food_name": "Organic Bread",
+                "food_item_description": "A freshly baked whole wheat bread loaf with a crunchy crust and soft interior",
+                "price": "3.50 EUR",
+                "quantity": "500 grams"
+            }}
+        ]
+
+        TEXT:
+        {page_text}
+        """
+
+# Define schema as a dictionary instead of using list[FoodItem]
+EXTRACTION_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "source_url": {"type": "string"},
+            "food_name": {"type": "string"},
+            "food_item_description": {"type": "string"},
+            "price": {"type": "string"},
+            "quantity": {"type": "string"}
+        },
+        "required": ["food_name", "food_item_description", "price", "quantity"]
+    }
+}
+
+EXTRACTION_PROMPT_VERSION = hashlib.sha256(
+    (EXTRACTION_MODEL + EXTRACTION_PROMPT + json.dumps(EXTRACTION_RESPONSE_SCHEMA, sort_keys=True)).encode()
+).hexdigest()[:16]
+
+
+def request_food_items(page_text: str) -> list[FoodItem]:
+    """Ask Gemini for the food items in page_text. Raises on API or parsing errors."""
+    response = get_gateway().generate_content(
+        operation="food_extraction",
+        model=EXTRACTION_MODEL,
+        contents=EXTRACTION_PROMPT.format(page_text=page_text),
+        config={
+            "response_mime_type": "application/json",
+            "response_schema": EXTRACTION_RESPONSE_SCHEMA,
+            "temperature": 0,
+        },
+    )
+
+    # Parse the response into FoodItem objects
+    items_data = response.text
+    if not items_data:
+        return []
+
+    food_items = []
+    for item_data in json.loads(items_data):
+        # Add source_url if not provided
+        if "source_url" not in item_data:
+            item_data["source_url"] = ""
+
+        food_items.append(FoodItem(**item_data))
+
+    return food_items
+
+
+def extract_food_items(page_text: str) -> list[FoodItem]:
+    """Use the Gemini API to extract food item details from page_text.
+    Returns a list of FoodItem objects, or an empty list on errors.
+    """
+    if not GEMINI_API_KEY:
+        return []
+    try:
+        return request_food_items(page_text)
+    except Exception:
+        logger.exception("Gemini extraction failed")
+        return []
+
+
+def preprocess_page(html: str, stats: PreprocessStats | None = None) -> str:
+    """Reduce a page to its visible offer text and record the token savings."""
+    page_text = html_to_text(html)
+    input_tokens, output_tokens = estimate_tokens(html), estimate_tokens(page_text)
+    logger.debug(f"Preprocessed page: ~{input_tokens} -> ~{output_tokens} tokens")
+    if stats is not None:
+        stats.record(input_tokens, output_tokens, len(chunk_text(page_text)))
+    return page_text
+
+
+def extract_page_items(page_text: str, cache_stats: CacheStats | None = None) -> list[FoodItem]:
+    """Extract each chunk of a preprocessed page in parallel and merge the results.
+
+    Pages whose normalized text was already extracted with the current prompt are served from the
+    extraction cache without calling the LLM. Raises when any chunk fails, so a page is either
+    fully re-extracted or left as it was.
+    """
+    key = cache_key(page_text, EXTRACTION_PROMPT_VERSION)
+    cached = get_cached_items(key)
+    if cached is not None:
+        if cache_stats is not None:
+            cache_stats.hit()
+        return [FoodItem(**item) for item in cached]
+    if cache_stats is not None:
+        cache_stats.miss()
+    if not GEMINI_API_KEY:
+        raise RuntimeError("Gemini API key not configured")
+
+    # Overlapping chunks repeat offers near their boundaries; keep the first occurrence
+    merged = {}
+    for chunk_items in chunk_executor.map(request_food_items, chunk_text(page_text)):
+        for item in chunk_items:
+            key_fields = (item.food_name, item.price, item.quantity)
+            merged.setdefault(tuple(field.strip().casefold() for field in key_fields), item)
+
+    items = list(merged.values())
+    store_items(key, EXTRACTION_PROMPT_VERSION, [item.model_dump() for item in items])
+    return items
+
+
+def load_validators(urls: list[str]) -> dict[str, PageValidator]:
+    """Load the stored validators of the given start URLs."""
+    session = get_session()
+    try:
+        validators = session.query(PageValidator).filter(PageValidator.url.in_(urls)).all()
+        session.expunge_all()
+        return {validator.url: validator for validator in validators}
+    finally:
+        session.close()
+
+
+def store_page(crawl_id: int, page: dict, items: list[FoodItem] | None, writer: BulkWriter) -> None:
+    """Write a crawled page into snapshot crawl_id and record its validators.
+
+    items is None for pages that were not modified; their items are carried over from the base snapshot.
+    New items are buffered in writer, which must be closed before the snapshot is published.
+    """
+    session = get_session()
+    try:
+        now = datetime.utcnow()
+        validator = session.get(PageValidator, page['page_url']) or PageValidator(url=page['page_url'])
+        validator.checked_at = now
+        if not page['not_modified']:
+            validator.etag = page['etag']
+            validator.last_modified = page['last_modified']
+
+        if items is None:
+            carry_over_items(session, crawl_id, {validator.source_url or page['source_url']})
+        else:
+            CRAWL_ITEMS.labels(host=urlparse(page['page_url']).hostname).inc(len(items))
+            writer.add([
+                {
+                    "crawl_id": crawl_id,
+                    "scraped_at": now,
+                    "source_url": page['source_url'],
+                    "food_name": item.food_name,
+                    "food_item_description": item.food_item_description,
+                    "price": item.price,
+                    "quantity": item.quantity,
+                    **normalized_columns(item.price, item.quantity),
+                }
+                for item in items
+            ])
+
+            validator.source_url = page['source_url']
+            validator.content_hash = page['content_hash']
+            validator.crawl_id = crawl_id
+            validator.changed_at = now
+
+        session.add(validator)
+        session.commit()
+    finally:
+        session.close()
+
+
+class ExtractionPipeline:
+    """Item pipeline handing raw pages to the extraction stage.
+
+    Downloading keeps running in the reactor while extraction workers call the
+    LLM in their own threads. A DeferredSemaphore sized to the stage's queue and
+    workers delays process_item once the stage is saturated, which stalls the
+    scraper without blocking the reactor or its thread pool.
+    """
+
+    def open_spider(self, spider):
+        self.crawl_id = spider.crawl_id
+        self.preprocess_stats = PreprocessStats()
+        self.cache_stats = CacheStats("extraction")
+        self.page_counts = Counter()
+        self.settled_pages = set()
+        self.page_counts_lock = Lock()
+        self.writer = BulkWriter(FoodItemDB.__table__)
+        self.stage = ExtractionStage(
+            self._extract,
+            self._store,
+            on_done=lambda: reactor.callFromThread(self.slots.release),
+        )
+        self.slots = DeferredSemaphore(self.stage.queue_size + self.stage.workers)
+        self.download_stats = StageStats("download")
+        self.stage.start()
+
+    def _count(self, outcome: str) -> None:
+        with self.page_counts_lock:
+            self.page_counts[outcome] += 1
+        CRAWL_PAGES.labels(outcome=outcome).inc()
+
+    def _store(self, page: dict, items: list[FoodItem] | None) -> None:
+        with CRAWL_PAGE_STAGE_SECONDS.labels(stage="insert").time():
+            store_page(self.crawl_id, page, items, self.writer)
+        with self.page_counts_lock:
+            self.settled_pages.add(page['page_url'])
+
+    def _extract(self, page: dict) -> list[FoodItem] | None:
+        if page['not_modified']:
+            self._count("not_modified")
+            return None
+
+        with CRAWL_PAGE_STAGE_SECONDS.labels(stage="preprocess").time():
+            page_text = preprocess_page(page['html'], self.preprocess_stats)
+        page['content_hash'] = hashlib.sha256(page_text.encode()).hexdigest()
+        if page['content_hash'] == page['previous_content_hash']:
+            self._count("unchanged")
+            return None
+
+        self._count("changed")
+        with CRAWL_PAGE_STAGE_SECONDS.labels(stage="extract").time():
+            return extract_page_items(page_text, self.cache_stats)
+
+    def process_item(self, item, spider):
+        self.download_stats.record(busy_seconds=item['download_latency'])
+        CRAWL_PAGE_STAGE_SECONDS.labels(stage="fetch").observe(item['download_latency'])
+
+        def enqueue(_):
+            self.stage.put(dict(item))
+            return {'source_url': item['source_url']}
+
+        return self.slots.acquire().addCallback(enqueue)
+
+    def close_spider(self, spider):
+        self.download_stats.finish()
+
+        def finish_crawl():
+            extract_stats = self.stage.close()
+            ingest_stats = self.writer.close()
+            crawl_stats = {
+                "crawl_id": self.crawl_id,
+                "download": self.download_stats.as_dict(),
+                "pages": dict(self.page_counts),
+                "preprocess": self.preprocess_stats.as_dict(),
+                "extraction_cache": self.cache_stats.as_dict(),
+                "extract": extract_stats,
+                "ingest": ingest_stats,
+            }
+            spider.logger.info(f"Crawl stage stats: {crawl_stats}")
+
+            # Pages that failed to download or extract keep their previous items in the new snapshot
+            carry_over_pages(self.crawl_id, set(WEBSITES) - self.settled_pages)
+            publish_crawl_run(self.crawl_id, crawl_stats)
+            spider.logger.info(f"Published crawl snapshot {self.crawl_id}")
+
+            spider.logger.info(f"Garbage-collected {collect_garbage()} old crawl snapshots")
+            spider.logger.info(f"Evicted {evict_entries()} extraction cache entries")
+
+        return threads.deferToThread(finish_crawl)
+
+
+class FoodCrawler(scrapy.Spider):
+    name = "food_crawler"
+    custom_settings = {
+        'ITEM_PIPELINES': {ExtractionPipeline: 300},
+    }
+
+    def start_requests(self):
+        """
+        Yield requests for each website in the WEBSITES list, made conditional
+        on the validators stored by the previous crawl.
+        """
+        validators = load_validators(WEBSITES)
+        for url in WEBSITES:
+            headers = {
+                'User-Agent': (
+                    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                    '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+                ),
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                'Accept-Language': 'de,en-US;q=0.9,en;q=0.8',
+            }
+            validator = validators.get(url)
+            # Only send validators for pages whose items are stored, otherwise a 304 would leave them empty
+            if validator and validator.content_hash:
+                if validator.etag:
+                    headers['If-None-Match'] = validator.etag
+                if validator.last_modified:
+                    headers['If-Modified-Since'] = validator.last_modified
+
+            yield scrapy.Request(
+                url=url,
+                callback=self.parse_page,
+                dont_filter=True,
+                headers=headers,
+                meta={
+                    'handle_httpstatus_list': [304],
+                    'page_url': url,
+                    'previous_content_hash': validator.content_hash if validator else None,
+                },
+            )
+
+    def parse_page(self, response):
+        """Emit the raw page; food items are extracted by the ExtractionPipeline."""
+        not_modified = response.status == 304
+        yield {
+            'page_url': response.meta['page_url'],
+            'source_url': response.url,
+            'not_modified': not_modified,
+            'previous_content_hash': response.meta['previous_content_hash'],
+            'html': None if not_modified else response.text,
+            'etag': response.headers.get('ETag', b'').decode() or None,
+            'last_modified': response.headers.get('Last-Modified', b'').decode() or None,
+            'download_latency': response.meta.get('download_latency', 0.0),
+        }
@@ -0,0 +1,164 @@
+"""Cold start check for the API.
+
+Imports api.index in fresh interpreters, serves a read-only request through the
+ASGI app without a database, and reports import time, peak RSS, which heavy
+dependencies got loaded and whether a database engine was created. With --check
+it exits 1 when one of HEAVY_MODULES is imported, an engine exists after the
+request, or a --max-import-seconds / --max-rss-mb budget is exceeded:
+
+    python -m benchmarks.coldstart --check
+    python -m benchmarks.coldstart --importtime     # slowest imports by cumulative time
+
+Only /api/py/hello is requested. Routes that read the database, such as
+/api/py/crawler/status, create the engines and load the driver on their first
+request by design; the probe checks that nothing before that point does, not
+the latency of that first database request.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Dependencies only the crawler worker, the Gemini calls or a database connection need
+HEAVY_MODULES = ("scrapy", "twisted", "nest_asyncio", "google.genai", "asyncpg", "psycopg2", "lxml")
+
+PROBE = """
+import asyncio, json, resource, sys, time
+
+def rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+baseline_rss_mb = rss_mb()
+started = time.perf_counter()
+from api.index import app
+import_seconds = time.perf_counter() - started
+imported = set(sys.modules)
+
+async def request(path):
+    messages = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        messages.append(message)
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 0), "server": ("probe", 80),
+    }
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    return messages[0]["status"], time.perf_counter() - started
+
+status, first_request_seconds = asyncio.run(request("/api/py/hello"))
+from api.logic import database
+print(json.dumps({
+    "import_seconds": import_seconds,
+    "first_request_seconds": first_request_seconds,
+    "first_request_status": status,
+    "baseline_rss_mb": baseline_rss_mb,
+    "max_rss_mb": rss_mb(),
+    "modules_at_import": sorted(imported),
+    "modules_after_request": sorted(sys.modules),
+    "engines_created": database._engine is not None or database._async_engine is not None,
+}))
+"""
+
+
+def probe_env() -> dict:
+    env = dict(os.environ)
+    # A read-only cold start must not need the database or run the schema upgrades
+    env.pop("POSTGRES_URL_NO_SSL", None)
+    env["DB_INIT_ON_STARTUP"] = "false"
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def run_probe() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=probe_env(), capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def loaded_heavy_modules(modules: list[str]) -> list[str]:
+    return sorted({
+        heavy for heavy in HEAVY_MODULES for module in modules
+        if module == heavy or module.startswith(heavy + ".")
+    })
+
+
+def measure(runs: int = 5) -> dict:
+    """Median import time over fresh interpreters, peak RSS and heavy modules loaded."""
+    probes = [run_probe() for _ in range(runs)]
+    last = probes[-1]
+    return {
+        "runs": runs,
+        "import_seconds": statistics.median(probe["import_seconds"] for probe in probes),
+        "first_request_seconds": statistics.median(probe["first_request_seconds"] for probe in probes),
+        "first_request_status": last["first_request_status"],
+        "baseline_rss_mb": last["baseline_rss_mb"],
+        "max_rss_mb": max(probe["max_rss_mb"] for probe in probes),
+        "modules_loaded": len(last["modules_after_request"]),
+        "heavy_modules_at_import": loaded_heavy_modules(last["modules_at_import"]),
+        "heavy_modules_after_request": loaded_heavy_modules(last["modules_after_request"]),
+        "engines_created": any(probe["engines_created"] for probe in probes),
+    }
+
+
+def slowest_imports(limit: int) -> list[tuple[int, str]]:
+    """Modules with the largest cumulative import time in microseconds, from python -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api.index"],
+        cwd=ROOT, env=probe_env(), capture_output=True, text=True, check=True,
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.removeprefix("import time:").split("|")
+        timings.append((int(cumulative), module.strip()))
+    return sorted(timings, reverse=True)[:limit]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the API's cold start")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to measure")
+    parser.add_argument("--check", action="store_true", help="exit 1 when heavy modules load or a budget is exceeded")
+    parser.add_argument("--max-import-seconds", type=float, help="budget for importing api.index")
+    parser.add_argument("--max-rss-mb", type=float, help="budget for the peak RSS after the first request")
+    parser.add_argument("--importtime", type=int, nargs="?", const=25, metavar="N", help="show the N slowest imports")
+    args = parser.parse_args()
+
+    report = measure(args.runs)
+    print(json.dumps(report, indent=2))
+    if args.importtime:
+        for cumulative, module in slowest_imports(args.importtime):
+            print(f"{cumulative / 1000:>9.1f} ms  {module}")
+
+    if not args.check:
+        return
+    failures = []
+    if report["heavy_modules_after_request"]:
+        failures.append(f"heavy modules loaded: {', '.join(report['heavy_modules_after_request'])}")
+    if report["engines_created"]:
+        failures.append("a database engine was created without a database request")
+    if report["first_request_status"] != 200:
+        failures.append(f"/api/py/hello answered {report['first_request_status']}")
+    if args.max_import_seconds is not None and report["import_seconds"] > args.max_import_seconds:
+        failures.append(f"import took {report['import_seconds']:.2f}s, budget {args.max_import_seconds:.2f}s")
+    if args.max_rss_mb is not None and report["max_rss_mb"] > args.max_rss_mb:
+        failures.append(f"peak RSS {report['max_rss_mb']:.0f} MB, budget {args.max_rss_mb:.0f} MB")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
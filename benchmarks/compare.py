@@ -0,0 +1,74 @@
+"""Compare two benchmark reports and fail on regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.1
+
+Metrics ending in _per_second are better when higher, latencies and durations
+(names containing _ms or _seconds) when lower; other values such as counts are
+shown but never fail the comparison.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def flatten(tree: dict, prefix: str = "") -> dict[str, float]:
+    metrics = {}
+    for key, value in tree.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            metrics.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = float(value)
+    return metrics
+
+
+def direction(metric: str) -> int:
+    """1 if larger is better, -1 if smaller is better, 0 if the metric is informational."""
+    leaf = metric.rsplit(".", 1)[-1]
+    if leaf.endswith("_per_second"):
+        return 1
+    if "_ms" in leaf or "_seconds" in leaf or leaf == "seconds":
+        return -1
+    return 0
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> tuple[list[tuple], list[str]]:
+    """Return one row per shared metric and the names of the regressed ones."""
+    before, after = flatten(baseline["benchmarks"]), flatten(candidate["benchmarks"])
+    rows, regressions = [], []
+    for metric in sorted(before.keys() & after.keys()):
+        old, new = before[metric], after[metric]
+        change = (new - old) / old if old else 0.0
+        better = direction(metric)
+        regressed = better != 0 and -better * change > threshold
+        if regressed:
+            regressions.append(metric)
+        rows.append((metric, old, new, change, regressed))
+    return rows, regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    baseline = json.loads(args.baseline.read_text())
+    candidate = json.loads(args.candidate.read_text())
+    rows, regressions = compare(baseline, candidate, args.threshold)
+
+    print(f"{baseline['meta'].get('git_revision')} -> {candidate['meta'].get('git_revision')}")
+    width = max((len(row[0]) for row in rows), default=0)
+    for metric, old, new, change, regressed in rows:
+        marker = "  REGRESSION" if regressed else ""
+        print(f"{metric:<{width}}  {old:>12.3f}  {new:>12.3f}  {change:>+8.1%}{marker}")
+
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from threading import Lock
+from types import SimpleNamespace
+
+from google.genai import errors
+
+from .fixtures import load_meal_plan
+
+# Simulated Gemini behaviour, overridable per run
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+FAKE_LLM_JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "0"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "42"))
+
+# "Hähnchenbrustfilet\n1 kg\n3,99 €" as produced by html_to_text for a product tile
+_OFFER_RE = re.compile(r"(?P<name>[^\n]+)\n(?P<quantity>[\d.,]+ ?[^\W\d_]+)\n(?:[\d.,]+ )?(?P<price>\d+,\d{2}) ?€")
+
+
+class FakeLLMClient:
+    """Deterministic stand-in for genai.Client implementing the gateway's LLMClient protocol.
+
+    Food extraction returns one item per offer found in the prompt text, video analysis
+    returns the canned meal plan fixture. Latency, jitter and the share of calls failing
+    with a retryable 503 are configurable; the random sequence is seeded.
+    """
+
+    def __init__(
+            self,
+            latency_ms: float = FAKE_LLM_LATENCY_MS,
+            jitter_ms: float = FAKE_LLM_JITTER_MS,
+            error_rate: float = FAKE_LLM_ERROR_RATE,
+            seed: int = FAKE_LLM_SEED,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._random_lock = Lock()
+        self.models = FakeModels(self)
+        self.files = FakeFiles(self)
+
+    def simulate_call(self) -> None:
+        """Sleep for the configured latency and fail a share of calls like an overloaded backend."""
+        with self._random_lock:
+            delay_ms = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            fail = self._random.random() < self.error_rate
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        if fail:
+            raise errors.ServerError(503, {"error": {"code": 503, "message": "Simulated overload", "status": "UNAVAILABLE"}})
+
+
+class FakeModels:
+    def __init__(self, client: FakeLLMClient):
+        self._client = client
+
+    def generate_content(self, *, model: str, contents, config=None):
+        self._client.simulate_call()
+        prompt = contents if isinstance(contents, str) else ""
+        schema = config.get("response_schema") if isinstance(config, dict) else getattr(config, "response_schema", None)
+
+        if isinstance(schema, type) and hasattr(schema, "model_validate"):
+            document = load_meal_plan()
+            parsed = schema.model_validate(document)
+        else:
+            document = [
+                {
+                    "food_name": match["name"].strip(),
+                    "food_item_description": f"{match['name'].strip()} on offer",
+                    "price": f"{match['price'].replace(',', '.')} EUR",
+                    "quantity": match["quantity"],
+                }
+                for match in _OFFER_RE.finditer(prompt)
+            ]
+            parsed = None
+
+        text = json.dumps(document)
+        usage = SimpleNamespace(
+            prompt_token_count=len(prompt) // 4 or 1000,
+            candidates_token_count=len(text) // 4,
+            total_token_count=(len(prompt) + len(text)) // 4 or 1000,
+        )
+        return SimpleNamespace(text=text, parsed=parsed, usage_metadata=usage)
+
+
+class FakeFiles:
+    def __init__(self, client: FakeLLMClient):
+        self._client = client
+        self._files = {}
+
+    def upload(self, *, file, config=None):
+        self._client.simulate_call()
+        digest = hashlib.sha256(str(file).encode()).hexdigest()[:16]
+        uploaded = SimpleNamespace(
+            name=f"files/fake-{digest}",
+            uri=f"https://generativelanguage.googleapis.com/v1beta/files/fake-{digest}",
+            mime_type=getattr(config, "mime_type", None) or "video/mp4",
+            state="ACTIVE",
+            expiration_time=None,
+        )
+        self._files[uploaded.name] = uploaded
+        return uploaded
+
+    def get(self, *, name: str):
+        return self._files[name]
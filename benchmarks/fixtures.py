@@ -0,0 +1,79 @@
+import json
+import random
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+PAGES_DIR = FIXTURES_DIR / "pages"
+
+# Store layouts: (file name, CSS class of an offer tile, tiles per page)
+STORES = [
+    ("discounter_weekly_offers.html", "product-tile", 120),
+    ("supermarket_offers.html", "offer-card", 200),
+    ("hypermarket_category.html", "artikel-kachel", 400),
+]
+
+PRODUCTS = [
+    ("Hähnchenbrustfilet", "g", (400, 1000)), ("Rinderhackfleisch", "g", (400, 1000)),
+    ("Vollmilch 3,5%", "l", (1, 1)), ("Gouda jung", "g", (200, 400)), ("Bio Eier", "Stück", (6, 10)),
+    ("Spaghetti", "g", (500, 1000)), ("Basmati Reis", "kg", (1, 1)), ("Tomaten passiert", "g", (500, 500)),
+    ("Zwiebeln", "kg", (1, 2)), ("Kartoffeln festkochend", "kg", (2, 5)), ("Lachsfilet", "g", (250, 500)),
+    ("Naturjoghurt", "g", (500, 500)), ("Butter", "g", (250, 250)), ("Olivenöl extra vergine", "ml", (500, 750)),
+    ("Paprika rot", "Stück", (1, 3)), ("Bananen", "kg", (1, 1)), ("Äpfel Elstar", "kg", (1, 2)),
+    ("Mozzarella", "g", (125, 125)), ("Weizenmehl Type 405", "kg", (1, 1)), ("Orangensaft", "l", (1, 1)),
+]
+BRANDS = ["GUT&GÜNSTIG", "ja!", "K-Classic", "Milbona", "Rewe Beste Wahl", "Aldi Nord", "Bio Sonne", "Golden Seafood"]
+
+
+def product_tile(rng: random.Random, css_class: str) -> str:
+    name, unit, (low, high) = rng.choice(PRODUCTS)
+    amount = rng.randint(low, high)
+    euros, cents = rng.randint(0, 12), rng.randint(0, 99)
+    old_price = f"{euros + rng.randint(1, 3)},{cents:02d}"
+    # Prices split across inline elements, as many retailers render them
+    return f"""
+    <div class="{css_class}" data-id="{rng.randint(10 ** 6, 10 ** 7)}">
+      <img src="/img/{rng.randint(1, 9999)}.jpg" alt="{name}">
+      <span class="brand">{rng.choice(BRANDS)}</span>
+      <h3 class="product-name">{name}</h3>
+      <p class="quantity">{amount} {unit}</p>
+      <div class="price"><span class="old">{old_price}</span> <b>{euros}</b>,<sup>{cents:02d}</sup> €</div>
+      <button class="add-to-cart">In den Warenkorb</button>
+    </div>"""
+
+
+def generate_page(css_class: str, tiles: int, seed: int) -> str:
+    rng = random.Random(seed)
+    boilerplate_script = "var dataLayer = [];" + "".join(f"track('{i}');" for i in range(200))
+    return f"""<!DOCTYPE html>
+<html lang="de">
+<head><title>Angebote der Woche</title><style>.{css_class}{{display:inline-block}}</style>
+<script>{boilerplate_script}</script></head>
+<body>
+<header><nav>{"".join(f'<a href="/c/{i}">Kategorie {i}</a>' for i in range(40))}</nav></header>
+<div id="cookie-consent" class="modal">Wir verwenden Cookies. <button>Akzeptieren</button></div>
+<main>
+  <h1>Angebote der Woche</h1>
+  <section class="offers">{"".join(product_tile(rng, css_class) for _ in range(tiles))}
+  </section>
+</main>
+<footer>{"".join(f"<p>Impressum Datenschutz AGB Filialfinder {i}</p>" for i in range(20))}</footer>
+</body>
+</html>
+"""
+
+
+def load_pages() -> dict[str, str]:
+    """Saved supermarket pages by file name."""
+    return {path.name: path.read_text(encoding="utf-8") for path in sorted(PAGES_DIR.glob("*.html"))}
+
+
+def load_meal_plan() -> dict:
+    return json.loads((FIXTURES_DIR / "meal_plan.json").read_text(encoding="utf-8"))
+
+
+if __name__ == "__main__":
+    # Regenerate the saved pages; they are committed so runs compare like with like
+    PAGES_DIR.mkdir(parents=True, exist_ok=True)
+    for seed, (file_name, css_class, tiles) in enumerate(STORES):
+        (PAGES_DIR / file_name).write_text(generate_page(css_class, tiles, seed), encoding="utf-8")
+        print(f"Wrote {PAGES_DIR / file_name}")
@@ -0,0 +1,228 @@
+"""Closed-loop HTTP load generator.
+
+Each of N virtual users sends its next request as soon as the previous one
+completed, picking endpoints from a weighted mix. The concurrency is stepped
+up, e.g. 1, 4, 16, 64, and every step reports latency percentiles, throughput
+and error rates per endpoint, which together form the saturation curve:
+
+    python -m benchmarks.load --concurrency 1 4 16 64 --duration 20
+    python -m benchmarks.load --mix analysis=8,job_status=4,upload=1 --output load.json
+    python -m benchmarks.load --url http://localhost:8000 --concurrency 8 32 128
+
+Without --url the app from api/index.py is driven in-process through httpx's
+ASGI transport, with the fake Gemini backend; client and server then share one
+event loop and CPU, so use --url against uvicorn for deployment sizing. In both
+modes the benchmark snapshot and meal plan are seeded through
+POSTGRES_URL_NO_SSL, which must be the database the server uses (a scratch one).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+
+from . import run
+from .stats import summarize_latencies
+
+ENDPOINTS = (
+    "analysis", "analysis_not_modified", "job_status", "is_done",
+    "results", "results_ndjson", "shopping_list_offers", "upload",
+)
+# Weight of each endpoint in the default mix, roughly what the frontend sends
+DEFAULT_MIX = "analysis=6,analysis_not_modified=4,job_status=3,is_done=2,results=2,results_ndjson=1,shopping_list_offers=1,upload=1"
+
+
+class LoadGenerator:
+    """Sends the request mix with a fixed number of concurrent virtual users."""
+
+    def __init__(self, client, mix: dict[str, int], upload_bytes: int, seed: int, context: dict):
+        self.client = client
+        self.endpoints = list(mix)
+        self.weights = list(mix.values())
+        self.upload_bytes = upload_bytes
+        self.random = random.Random(seed)
+        self.context = context
+        self.etag = None
+        # Recently created jobs, polled by job_status like the frontend does after an upload
+        self.job_ids = deque(maxlen=64)
+
+    async def prepare(self) -> None:
+        """Fetch the current ETag and create one job, so the conditional and polling requests have targets."""
+        response = await self.client.get("/api/py/analysis")
+        response.raise_for_status()
+        self.etag = response.headers.get("etag")
+        await self.upload(video=b"benchmark video")
+
+    async def upload(self, video: bytes | None = None):
+        # Distinct bytes per request miss the analysis cache and queue a job on the fake backend
+        video = video if video is not None else self.random.randbytes(self.upload_bytes)
+        response = await self.client.post(
+            "/api/py/analyze-video", files={"video": ("load.mp4", video, "video/mp4")},
+        )
+        if response.status_code == 202:
+            job = response.json()
+            self.job_ids.append(job["job_id"])
+            self.context.setdefault("file_hashes", set()).add(job["file_hash"])
+        return response
+
+    async def send(self, endpoint: str):
+        if endpoint == "upload":
+            return await self.upload()
+        if endpoint == "analysis":
+            return await self.client.get("/api/py/analysis")
+        if endpoint == "analysis_not_modified":
+            return await self.client.get("/api/py/analysis", headers={"If-None-Match": self.etag or "*"})
+        if endpoint == "job_status":
+            return await self.client.get(f"/api/py/is-done/{self.random.choice(self.job_ids)}")
+        if endpoint == "is_done":
+            return await self.client.get("/api/py/is-done")
+        if endpoint == "results":
+            return await self.client.get("/api/py/crawler/results", params={"limit": 500})
+        if endpoint == "results_ndjson":
+            # Read the stream to the end, so the latency covers the whole body
+            async with self.client.stream("GET", "/api/py/crawler/results", params={"format": "ndjson"}) as response:
+                await response.aread()
+                return response
+        if endpoint == "shopping_list_offers":
+            return await self.client.get("/api/py/shopping-list/offers")
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+    async def user(self, deadline: float, record) -> None:
+        while time.perf_counter() < deadline:
+            endpoint = self.random.choices(self.endpoints, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await self.send(endpoint)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            record(endpoint, time.perf_counter() - started, status)
+
+    async def step(self, concurrency: int, duration: float, warmup: float) -> dict:
+        """Run one concurrency level and summarize the requests completed after the warmup."""
+        timings = defaultdict(list)
+        statuses = defaultdict(Counter)
+        measure_from = time.perf_counter() + warmup
+
+        def record(endpoint: str, latency: float, status) -> None:
+            if time.perf_counter() >= measure_from:
+                timings[endpoint].append(latency)
+                statuses[endpoint][str(status)] += 1
+
+        deadline = measure_from + duration
+        await asyncio.gather(*(self.user(deadline, record) for _ in range(concurrency)))
+
+        endpoints = {
+            endpoint: summarize_endpoint(timings[endpoint], statuses[endpoint], duration)
+            for endpoint in self.endpoints
+        }
+        return {
+            "concurrency": concurrency,
+            "total": summarize_endpoint(
+                [latency for samples in timings.values() for latency in samples],
+                sum(statuses.values(), Counter()),
+                duration,
+            ),
+            "endpoints": endpoints,
+        }
+
+
+def summarize_endpoint(latencies: list[float], statuses: Counter, duration: float) -> dict:
+    # 304 is the expected answer to a conditional request; errors are 4xx/5xx and transport failures
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400)
+    count = len(latencies)
+    return {
+        **summarize_latencies(latencies),
+        "requests_per_second": count / duration,
+        "error_rate": errors / count if count else 0.0,
+        "statuses": dict(statuses),
+    }
+
+
+def parse_mix(spec: str) -> dict[str, int]:
+    mix = {}
+    for part in spec.split(","):
+        endpoint, _, weight = part.partition("=")
+        mix[endpoint.strip()] = int(weight or 1)
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown endpoints in mix: {', '.join(sorted(unknown))}")
+    return {endpoint: weight for endpoint, weight in mix.items() if weight > 0}
+
+
+def print_curve(steps: list[dict]) -> None:
+    print(f"{'users':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for step in steps:
+        total = step["total"]
+        print(
+            f"{step['concurrency']:>6} {total['requests_per_second']:>9.1f} {total['latency_ms_p50']:>9.1f} "
+            f"{total['latency_ms_p95']:>9.1f} {total['latency_ms_p99']:>9.1f} {total['error_rate']:>7.1%}"
+        )
+
+
+async def run_load(args, context: dict) -> list[dict]:
+    import httpx
+
+    if args.url:
+        transport = None
+    else:
+        from api.index import app
+        transport = httpx.ASGITransport(app=app)
+
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(
+            transport=transport, base_url=args.url or "http://benchmark", limits=limits, timeout=args.timeout,
+    ) as client:
+        generator = LoadGenerator(client, args.mix, args.upload_kb * 1024, args.seed, context)
+        await generator.prepare()
+        steps = []
+        for concurrency in args.concurrency:
+            print(f"Running {concurrency} users for {args.duration:g}s...", flush=True)
+            steps.append(await generator.step(concurrency, args.duration, args.warmup))
+        return steps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Closed-loop load test of the API")
+    parser.add_argument("--url", help="base URL of a running server (default: drive the app in-process)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help=f"endpoint=weight list (default: {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="virtual users per step")
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per step")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds at the start of each step")
+    parser.add_argument("--timeout", type=float, default=60, help="request timeout in seconds")
+    parser.add_argument("--upload-kb", type=int, default=512, help="size of each uploaded video")
+    parser.add_argument("--rows", type=int, default=20000, help="offers in the seeded snapshot")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="report path (default: benchmarks/reports/load-<timestamp>.json)")
+    args = parser.parse_args()
+
+    from api.logic.database import init_db
+    init_db()
+
+    report = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "git_revision": run.git_revision(),
+            "target": args.url or "in-process",
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "url")},
+        },
+    }
+    context = {}
+    try:
+        run.publish_benchmark_data(args, context)
+        report["steps"] = asyncio.run(run_load(args, context))
+    finally:
+        run.cleanup(context)
+
+    print_curve(report["steps"])
+    output = args.output or run.REPORTS_DIR / f"load-{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str) + "\n")
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""Offline benchmark suite.
+
+Runs against a local Postgres (POSTGRES_URL_NO_SSL) with the fake Gemini backend
+and writes a JSON report that benchmarks.compare can diff between runs:
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json
+    python -m benchmarks.compare before.json after.json
+
+Use a scratch database: the serving benchmarks temporarily publish their own
+crawl snapshot and add the latest meal plan, and remove both when they finish.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Point the app at the fake backend before any api module reads its configuration
+os.environ.setdefault("LLM_BACKEND", "benchmarks.fake_llm:FakeLLMClient")
+os.environ.setdefault("GEMINI_API_KEY", "fake")
+os.environ.setdefault("GEMINI_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("GEMINI_MAX_IN_FLIGHT", "64")
+
+from .fixtures import load_meal_plan, load_pages
+from .stats import summarize_latencies
+
+REPORTS_DIR = Path(__file__).parent / "reports"
+BENCHMARK_ANALYSIS_ID = "benchmark-" + "0" * 54
+
+
+def bench_cold_start(args) -> dict:
+    """Import the API and serve a read-only request in fresh interpreters."""
+    from .coldstart import measure
+
+    return measure(args.repeat)
+
+
+def bench_upload_hash(args) -> dict:
+    """Spool and hash an upload the way analyze_video does."""
+    from starlette.datastructures import UploadFile
+
+    from api.logic.uploads import remove_spooled_file, spool_upload
+
+    data = random.Random(0).randbytes(args.upload_mb * 1024 * 1024)
+    timings = []
+    for _ in range(args.repeat):
+        upload = UploadFile(file=io.BytesIO(data), filename="benchmark.mp4")
+        started = time.perf_counter()
+        path, _, size = asyncio.run(spool_upload(upload))
+        timings.append(time.perf_counter() - started)
+        remove_spooled_file(path)
+    best = min(timings)
+    return {"bytes": size, "seconds_min": best, "mb_per_second": size / 1024 / 1024 / best}
+
+
+def bench_preprocess(args) -> dict:
+    """Strip boilerplate from the saved supermarket pages and chunk them."""
+    from api.preprocess import PreprocessStats
+    from api.spider import preprocess_page
+
+    pages = list(load_pages().values())
+    stats = PreprocessStats()
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for html in pages:
+            preprocess_page(html, stats)
+    elapsed = time.perf_counter() - started
+    return {
+        **stats.as_dict(),
+        "seconds": elapsed,
+        "pages_per_second": stats.pages / elapsed,
+    }
+
+
+def bench_extract_parse(args) -> dict:
+    """Extract food items from preprocessed pages through the gateway and the fake backend."""
+    from api.spider import extract_food_items, preprocess_page
+
+    texts = [preprocess_page(html) for html in load_pages().values()]
+    items = 0
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            items += len(extract_food_items(text))
+    elapsed = time.perf_counter() - started
+    pages = len(texts) * args.repeat
+    return {
+        "pages": pages,
+        "items": items,
+        "seconds": elapsed,
+        "pages_per_second": pages / elapsed,
+        "items_per_second": items / elapsed,
+    }
+
+
+def offer_rows(count: int) -> list[dict]:
+    """Rows like the crawler stores them, extracted from the saved pages by the fake backend."""
+    from api.logic.normalize import normalized_columns
+    from api.spider import extract_food_items, preprocess_page
+
+    extracted = []
+    for name, html in load_pages().items():
+        for item in extract_food_items(preprocess_page(html)):
+            extracted.append({**item.model_dump(), "source_url": f"https://benchmark.invalid/{name}"})
+    return [
+        {**item, **normalized_columns(item["price"], item["quantity"])}
+        for item in (extracted[i % len(extracted)] for i in range(count))
+    ]
+
+
+def bench_db_ingest(args, context: dict) -> dict:
+    """Write offers into a fresh snapshot with the crawler's bulk writer."""
+    from api.logic.bulk import BulkWriter
+    from api.logic.database import CrawlRun, FoodItemDB, get_session
+
+    session = get_session()
+    try:
+        run = CrawlRun(status="benchmark")
+        session.add(run)
+        session.commit()
+        context["crawl_id"] = crawl_id = run.id
+    finally:
+        session.close()
+
+    rows = [{**row, "crawl_id": crawl_id} for row in offer_rows(args.rows)]
+    writer = BulkWriter(FoodItemDB.__table__)
+    started = time.perf_counter()
+    # Pages arrive from the extraction workers in batches of a few hundred items
+    for offset in range(0, len(rows), 200):
+        writer.add(rows[offset:offset + 200])
+    stats = writer.close()
+    elapsed = time.perf_counter() - started
+    return {"rows": len(rows), "flushes": stats["flushes"], "seconds": elapsed, "rows_per_second": len(rows) / elapsed}
+
+
+def publish_benchmark_data(args, context: dict) -> None:
+    """Publish the benchmark snapshot and make the fixture meal plan the latest analysis.
+
+    cleanup() restores the previous snapshot and removes both again.
+    """
+    from api.analysis import VIDEO_ANALYSIS_MODEL, VIDEO_ANALYSIS_PROMPT, latest_plan_cache
+    from api.logic.database import CrawlPointer, VideoAnalysis, get_session
+
+    if "crawl_id" not in context:
+        bench_db_ingest(args, context)
+
+    session = get_session()
+    try:
+        pointer = session.get(CrawlPointer, 1) or CrawlPointer(id=1)
+        context["previous_crawl_id"] = pointer.current_crawl_id
+        pointer.current_crawl_id = context["crawl_id"]
+        session.add(pointer)
+        session.merge(VideoAnalysis(
+            id=BENCHMARK_ANALYSIS_ID, filename="benchmark.mp4", content_type="video/mp4",
+            prompt=VIDEO_ANALYSIS_PROMPT, model=VIDEO_ANALYSIS_MODEL,
+            analysis_text=load_meal_plan(), created_at=datetime.utcnow(),
+        ))
+        session.commit()
+    finally:
+        session.close()
+    latest_plan_cache.invalidate()
+
+
+def bench_serve(args, context: dict) -> dict:
+    """Serve the meal plan and offer endpoints in-process against the benchmark snapshot."""
+    from fastapi.testclient import TestClient
+
+    from api.index import app
+
+    publish_benchmark_data(args, context)
+    results = {}
+    with TestClient(app) as client:
+        etag = client.get("/api/py/analysis").headers["etag"]
+        endpoints = {
+            "analysis": ("/api/py/analysis", {}),
+            "analysis_not_modified": ("/api/py/analysis", {"If-None-Match": etag}),
+            "results_page": ("/api/py/crawler/results?limit=500", {}),
+            "results_ndjson": ("/api/py/crawler/results?format=ndjson", {}),
+            "cheapest": ("/api/py/crawler/cheapest?unit=kg", {}),
+            "shopping_list_offers": ("/api/py/shopping-list/offers", {}),
+        }
+        for name, (url, headers) in endpoints.items():
+            client.get(url, headers=headers)  # warm caches and the connection pool
+            timings = []
+            errors = 0
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                response = client.get(url, headers=headers)
+                timings.append(time.perf_counter() - started)
+                errors += int(response.status_code >= 400)
+            results[name] = {**summarize_latencies(timings), "errors": errors}
+    return results
+
+
+def cleanup(context: dict) -> None:
+    from api.analysis import latest_plan_cache
+    from api.logic.database import CrawlPointer, CrawlRun, FoodItemDB, OperationStatus, VideoAnalysis, get_session
+
+    session = get_session()
+    try:
+        if "previous_crawl_id" in context:
+            session.get(CrawlPointer, 1).current_crawl_id = context["previous_crawl_id"]
+        if "crawl_id" in context:
+            session.query(FoodItemDB).filter(FoodItemDB.crawl_id == context["crawl_id"]).delete()
+            session.query(CrawlRun).filter(CrawlRun.id == context["crawl_id"]).delete()
+        session.query(VideoAnalysis).filter(VideoAnalysis.id == BENCHMARK_ANALYSIS_ID).delete()
+        # Analyses and jobs created by uploads during a load test
+        file_hashes = list(context.get("file_hashes", ()))
+        if file_hashes:
+            session.query(VideoAnalysis).filter(VideoAnalysis.id.in_(file_hashes)).delete()
+            session.query(OperationStatus).filter(OperationStatus.file_hash.in_(file_hashes)).delete()
+        session.commit()
+    finally:
+        session.close()
+    latest_plan_cache.invalidate()
+
+
+BENCHMARKS = {
+    "cold_start": bench_cold_start,
+    "upload_hash": bench_upload_hash,
+    "preprocess": bench_preprocess,
+    "extract_parse": bench_extract_parse,
+    "db_ingest": bench_db_ingest,
+    "serve": bench_serve,
+}
+# Benchmarks that share the seeded snapshot through the context
+USES_CONTEXT = {"db_ingest", "serve"}
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--output", type=Path, help="report path (default: benchmarks/reports/<timestamp>.json)")
+    parser.add_argument("--repeat", type=int, default=5, help="passes over the fixtures per benchmark")
+    parser.add_argument("--upload-mb", type=int, default=64, help="size of the simulated video upload")
+    parser.add_argument("--rows", type=int, default=20000, help="offers written by db_ingest")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint in serve")
+    args = parser.parse_args()
+
+    from api.logic.database import init_db
+    init_db()
+
+    report = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items() if key != "output"} | {
+                key: os.environ[key] for key in sorted(os.environ) if key.startswith("FAKE_LLM_")
+            },
+        },
+        "benchmarks": {},
+    }
+    context = {}
+    try:
+        for name in args.only or list(BENCHMARKS):
+            print(f"Running {name}...", flush=True)
+            bench = BENCHMARKS[name]
+            report["benchmarks"][name] = bench(args, context) if name in USES_CONTEXT else bench(args)
+    finally:
+        cleanup(context)
+
+    from api.llm import get_gateway
+    report["llm"] = get_gateway().stats()
+
+    output = args.output or REPORTS_DIR / f"{datetime.utcnow():%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str) + "\n")
+    print(json.dumps(report["benchmarks"], indent=2, default=str))
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import statistics
+
+
+def percentile(sorted_samples: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def summarize_latencies(seconds: list[float]) -> dict:
+    """Latency distribution in milliseconds."""
+    samples = sorted(seconds)
+    return {
+        "count": len(samples),
+        "latency_ms_mean": statistics.fmean(samples) * 1000 if samples else 0.0,
+        "latency_ms_p50": percentile(samples, 0.50) * 1000,
+        "latency_ms_p95": percentile(samples, 0.95) * 1000,
+        "latency_ms_p99": percentile(samples, 0.99) * 1000,
+        "latency_ms_max": samples[-1] * 1000 if samples else 0.0,
+    }
@@ -0,0 +1,15 @@
+import pytest
+
+# The probe imports the app in a fresh interpreter
+pytest.importorskip("fastapi")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("prometheus_client")
+
+from benchmarks import coldstart
+
+
+def test_read_only_request_loads_no_heavy_modules():
+    report = coldstart.measure(1)
+    assert report["heavy_modules_after_request"] == []
+    assert report["first_request_status"] == 200
+    assert not report["engines_created"]
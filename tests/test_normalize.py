@@ -0,0 +1,24 @@
+import pytest
+
+from api.logic.normalize import parse_price_cents
+
+
+@pytest.mark.parametrize(
+    ("price", "cents"),
+    [
+        ("2.99 EUR", 299),
+        ("2,99 €", 299),
+        ("0,5 EUR", 50),
+        ("12 EUR", 1200),
+        ("1.234,50 EUR", 123450),
+        ("1.000 EUR", 100000),
+        # Four or more digits without a thousands separator
+        ("1234.99 EUR", 123499),
+        ("1299 EUR", 129900),
+        ("1299,00 €", 129900),
+        ("free", None),
+        (None, None),
+    ],
+)
+def test_parse_price_cents(price, cents):
+    assert parse_price_cents(price) == cents
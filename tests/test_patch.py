@@ -0,0 +1,101 @@
+import pytest
+
+pytest.importorskip("pydantic")
+
+from pydantic import ValidationError
+
+from api.logic.models import MealPlan
+from api.logic.patch import PatchError, PatchTestFailed, apply_json_patch, apply_merge_patch, validate_changed
+
+
+def plan() -> dict:
+    return {
+        "shopping_list": {"items": [{"name": "rice", "quantity": 500, "unit": "g"}]},
+        "recipes": [{"name": "Risotto", "ingredients": [], "instructions": ["Cook"]}],
+        "days": [
+            {"day": "Monday", "meal": "Risotto", "recipe_refs": ["Risotto"]},
+            {"day": "Tuesday", "meal": None, "recipe_refs": []},
+        ],
+    }
+
+
+def test_add_appends_with_dash_index():
+    item = {"name": "salt", "quantity": 1, "unit": "pinch"}
+    document, changed = apply_json_patch(plan(), [{"op": "add", "path": "/shopping_list/items/-", "value": item}])
+    assert document["shopping_list"]["items"][-1] == item
+    assert changed == [["shopping_list", "items", "-"]]
+
+
+def test_add_inserts_at_index():
+    document, _ = apply_json_patch(plan(), [{"op": "add", "path": "/days/0/recipe_refs/0", "value": "Soup"}])
+    assert document["days"][0]["recipe_refs"] == ["Soup", "Risotto"]
+
+
+def test_remove_and_replace():
+    document, changed = apply_json_patch(plan(), [
+        {"op": "remove", "path": "/days/1"},
+        {"op": "replace", "path": "/days/0/meal", "value": "Pasta"},
+    ])
+    assert [day["day"] for day in document["days"]] == ["Monday"]
+    assert document["days"][0]["meal"] == "Pasta"
+    assert changed == [["days", "1"], ["days", "0", "meal"]]
+
+
+def test_move_and_copy():
+    document, changed = apply_json_patch(plan(), [
+        {"op": "copy", "from": "/days/0/meal", "path": "/days/1/meal"},
+        {"op": "move", "from": "/days/0/recipe_refs/0", "path": "/days/1/recipe_refs/-"},
+    ])
+    assert document["days"][1] == {"day": "Tuesday", "meal": "Risotto", "recipe_refs": ["Risotto"]}
+    assert document["days"][0]["recipe_refs"] == []
+    assert ["days", "0", "recipe_refs", "0"] in changed
+
+
+def test_test_operation():
+    operations = [{"op": "test", "path": "/days/0/day", "value": "Monday"}]
+    assert apply_json_patch(plan(), operations) == (plan(), [])
+    with pytest.raises(PatchTestFailed):
+        apply_json_patch(plan(), [{"op": "test", "path": "/days/0/day", "value": "Friday"}])
+
+
+def test_patch_does_not_modify_the_input():
+    original = plan()
+    apply_json_patch(original, [{"op": "remove", "path": "/recipes/0"}])
+    assert original == plan()
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "remove", "path": "/days/5"},
+    {"op": "replace", "path": "/missing", "value": 1},
+    {"op": "add", "path": "/days/01", "value": {}},
+    {"op": "move", "from": "/days", "path": "/days/0"},
+    {"op": "frobnicate", "path": "/days"},
+])
+def test_invalid_operations(operation):
+    with pytest.raises(PatchError):
+        apply_json_patch(plan(), [operation])
+
+
+def test_merge_patch_null_deletes():
+    document, changed = apply_merge_patch(plan(), {"days": None, "recipes": None})
+    assert document == {"shopping_list": plan()["shopping_list"]}
+    assert changed == [["days"], ["recipes"]]
+
+
+def test_merge_patch_replaces_values():
+    document, changed = apply_merge_patch(plan(), {"shopping_list": {"items": []}})
+    assert document["shopping_list"] == {"items": []}
+    assert changed == [["shopping_list", "items"]]
+
+
+@pytest.mark.parametrize("patch", [{"recipes": {}}, {"shopping_list": {"items": {}}}])
+def test_merge_patch_object_over_list_is_validated(patch):
+    document, changed = apply_merge_patch(plan(), patch)
+    assert changed
+    with pytest.raises(ValidationError):
+        validate_changed(MealPlan, document, changed)
+
+
+def test_validate_changed_accepts_valid_edit():
+    document, changed = apply_json_patch(plan(), [{"op": "replace", "path": "/days/1/meal", "value": "Soup"}])
+    validate_changed(MealPlan, document, changed)
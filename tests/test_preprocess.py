@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("lxml")
+
+from api.preprocess import chunk_text
+
+
+def test_short_text_is_one_chunk():
+    assert chunk_text("a\nb", max_chars=10, overlap_chars=2) == ["a\nb"]
+    assert chunk_text("", max_chars=10, overlap_chars=2) == []
+
+
+def test_chunks_respect_max_chars_and_overlap():
+    lines = [f"offer {i:03d}" for i in range(100)]
+    chunks = chunk_text("\n".join(lines), max_chars=100, overlap_chars=20)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert {line for chunk in chunks for line in chunk.splitlines()} == set(lines)
+    assert chunks[0].splitlines()[-1] in chunks[1].splitlines()
+
+
+def test_long_line_is_split_into_overlapping_windows():
+    text = "".join(chr(ord("a") + i % 26) for i in range(30000))
+    chunks = chunk_text(text, max_chars=24000, overlap_chars=1000)
+    assert [len(chunk) for chunk in chunks] == [24000, 7000]
+    assert chunks[0][-1000:] == chunks[1][:1000]
+    assert chunks[0] + chunks[1][1000:] == text